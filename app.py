@@ -1,11 +1,9 @@
+import time
 import streamlit as st
-import numpy as np
+from concurrent.futures import FIRST_COMPLETED, wait
 from predict_model import predict_by_model
-from predict_ai import predict_by_ai, check_timeliness, generate_investment_advice
-from stock_data import get_stock_data
-from plot_utils import plot_stock_kline
-from plot_utils import plot_stock_kline, run_monte_carlo_simulation, plot_monte_carlo
-from predict_ai import generate_monte_carlo_advice
+from worker_pool import WORKER_POOL_SIZE, get_worker_pool
+from predict_ai import StaleNewsError, predict_by_ai, submit_analysis, submit_monte_carlo
 
 # --- 第1步：初始化 Session State ---
 # 把所有可能在多次刷新中需要保持状态的变量都在这里初始化
@@ -79,7 +77,11 @@ if st.button("开始判别", type="primary"):
         st.session_state.result_data = {} # 清空旧数据
         with st.spinner("正在智能判别中..."):
             if mode == "使用我们的模型！":
-                result, prob, sentiment = predict_by_model(title, content, platform_code)
+                # 设置了 FAKENEWS_WORKERS 时交给共享权重的推理进程池，否则在本进程推理
+                if WORKER_POOL_SIZE > 0:
+                    result, prob, sentiment = get_worker_pool().predict(title, content, platform_code)
+                else:
+                    result, prob, sentiment = predict_by_model(title, content, platform_code)
                 # 把结果存入session_state
                 st.session_state.result_data = {
                     "mode": "model", "result": result, "prob": prob, "sentiment": sentiment
@@ -128,72 +130,103 @@ if st.session_state.show_results:
             value=st.session_state.stock_code_input
         )
 
-        # "生成分析"按钮现在只负责数据获取和设置显示状态
+        # "生成分析"按钮只记录分析的输入并设置显示状态；各阶段按输入记忆，脚本重跑时直接复用已完成的结果
         if st.button("生成投资建议与分析", use_container_width=True):
             if st.session_state.stock_code_input:
                 st.session_state.show_investment_analysis = True # 打开显示开关
-                st.session_state.analysis_data = {} # 清空旧数据
-                
-                with st.spinner("正在获取长短期数据..."):
-                    stock_code = st.session_state.stock_code_input
-                    news_date_str = str(date.strftime('%Y-%m-%d'))
-                    
-                    if check_timeliness(news_date_str, stock_code):
-                        hist_df = get_stock_data(stock_code, news_date_str, days=365)
-                        # 将获取到的数据存入 state
-                        st.session_state.analysis_data['hist_df'] = hist_df
-                        st.session_state.analysis_data['news_title'] = title
-                        st.session_state.analysis_data['news_content'] = content
-                    else:
-                        st.warning("此信息或已失效，请您谨慎投资")
-                        st.session_state.show_investment_analysis = False # 如果失效，就不显示
+                st.session_state.analysis_data = {
+                    'stock_code': st.session_state.stock_code_input,
+                    'news_date_str': str(date.strftime('%Y-%m-%d')),
+                    'news_title': title,
+                    'news_content': content,
+                }
             else:
                 st.warning("请输入股票代码！")
-        
+
         # --- 所有显示逻辑，都由 session_state 控制，而不是 button 控制 ---
-        if st.session_state.show_investment_analysis and 'hist_df' in st.session_state.analysis_data:
-            
-            hist_df = st.session_state.analysis_data.get('hist_df')
-
-            if hist_df is not None and not hist_df.empty:
-                
-                # --- Part 1: 基本面与技术面分析 ---
-                st.subheader("Part 1: 基于新闻的基本面与技术面分析")
-                recent_df = hist_df.tail(30)
-                st.plotly_chart(plot_stock_kline(recent_df), use_container_width=True)
-                
-                # 从 state 中恢复新闻内容
-                news_title = st.session_state.analysis_data.get('news_title', '')
-                news_content = st.session_state.analysis_data.get('news_content', '')
-
-                short_data_str = hist_df.tail(7)[['trade_date', 'open', 'close', 'high', 'low', 'vol']].to_string()
-                long_data_str = recent_df[['trade_date', 'open', 'close', 'high', 'low', 'vol']].to_string()
-                
-                suggestion = generate_investment_advice(f"{news_title} {news_content}", short_data_str, long_data_str)
-                st.markdown(suggestion)
-                
-                st.divider()
-
-                # --- Part 2: 蒙特卡洛模拟 ---
-                st.subheader("Part 2: 基于蒙特卡洛模拟的未来股价概率分析")
-                
-                # 将 selectbox 的值与 session_state 绑定
-                st.session_state.sim_days = st.selectbox(
-                    "选择模拟周期（天）", 
-                    [30, 90, 365], 
-                    index=[30, 90, 365].index(st.session_state.sim_days) # 保证选择的值被记住
-                )
-                
-                with st.spinner(f"正在进行 {st.session_state.sim_days} 天的蒙特卡洛模拟..."):
-                    sim_df, end_prices = run_monte_carlo_simulation(hist_df, sim_days=st.session_state.sim_days, num_simulations=1000)
-                    
-                    start_price = hist_df['close'].iloc[-1]
-                    mc_fig, prob_higher = plot_monte_carlo(sim_df, end_prices, start_price)
-                    
-                    st.plotly_chart(mc_fig, use_container_width=True)
-                    
-                    median_price = np.median(end_prices)
-                    mc_advice = generate_monte_carlo_advice(st.session_state.stock_code_input, st.session_state.sim_days, prob_higher, median_price)
-                    st.markdown(mc_advice)
-            else:
-                st.error("股票数据获取失败，请检查代码或日期。")
+        if st.session_state.show_investment_analysis and st.session_state.analysis_data:
+            analysis = st.session_state.analysis_data
+            jobs = submit_analysis(analysis['news_title'], analysis['news_content'],
+                                   analysis['news_date_str'], analysis['stock_code'], days=365)
+
+            # --- Part 1: 基本面与技术面分析 ---
+            st.subheader("Part 1: 基于新闻的基本面与技术面分析")
+            kline_slot = st.empty()
+            advice_slot = st.empty()
+
+            st.divider()
+
+            # --- Part 2: 蒙特卡洛模拟 ---
+            st.subheader("Part 2: 基于蒙特卡洛模拟的未来股价概率分析")
+
+            # 将 selectbox 的值与 session_state 绑定
+            st.session_state.sim_days = st.selectbox(
+                "选择模拟周期（天）",
+                [30, 90, 365],
+                index=[30, 90, 365].index(st.session_state.sim_days) # 保证选择的值被记住
+            )
+            sim_days = st.session_state.sim_days
+            # 切换周期只会提交新周期的模拟和解读，行情、K线图和投资建议都直接复用；
+            # 和 Part 1 一样等时效性判断通过后才提交，失效的新闻不会拉取行情、也不会调用 Gemini
+            mc_jobs = submit_monte_carlo(analysis['stock_code'], analysis['news_date_str'], sim_days, days=365,
+                                         timely=jobs['timely'])
+            mc_slot = st.empty()
+            mc_advice_slot = st.empty()
+
+            # 按完成顺序逐块渲染，总耗时接近最慢的单个调用而非各调用之和；已记忆的阶段立即显示
+            slots = {
+                jobs['kline']: kline_slot, jobs['advice']: advice_slot,
+                mc_jobs['simulation']: mc_slot, mc_jobs['advice']: mc_advice_slot,
+            }
+            waiting_messages = {
+                jobs['kline']: "正在获取长短期数据...", jobs['advice']: "正在生成投资建议...",
+                mc_jobs['simulation']: f"正在进行 {sim_days} 天的蒙特卡洛模拟...", mc_jobs['advice']: "正在解读模拟结果...",
+            }
+            for future, slot in slots.items():
+                if not future.done():
+                    slot.info(waiting_messages[future])
+            # 两段建议文本在后台线程中流式生成：与其他阶段放在同一个循环里轮询，边接收边渲染，
+            # 不会因为等一段文本生成完而推迟图表、另一段文本或时效性判断的显示；重跑时回放已生成的内容
+            pending = {jobs['timely'], *slots}
+            streams = {}   # 建议文本的 Future -> [TextStream, 已渲染的文本]
+            while pending or streams:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                stale = False
+                for future in done:
+                    if future is jobs['timely']:
+                        if not future.cancelled() and not future.exception() and not future.result():
+                            stale = True
+                        continue
+
+                    slot = slots[future]
+                    if future.cancelled():
+                        slot.empty()
+                    elif future.exception() is not None:
+                        if future is jobs['kline'] and not isinstance(future.exception(), StaleNewsError):
+                            slot.error(f"股票数据获取失败: {future.exception()}")
+                        else:
+                            slot.empty()
+                    elif future is jobs['kline']:
+                        slot.plotly_chart(future.result(), use_container_width=True)
+                    elif future is mc_jobs['simulation']:
+                        slot.plotly_chart(future.result()['fig'], use_container_width=True)
+                    else:
+                        streams[future] = [future.result(), None]
+
+                if stale:
+                    # 各阶段由所有会话共享，这里只停止渲染，不取消
+                    st.session_state.show_investment_analysis = False # 如果失效，就不显示
+                    for slot in slots.values():
+                        slot.empty()
+                    st.warning("此信息或已失效，请您谨慎投资")
+                    break
+
+                for future, entry in list(streams.items()):
+                    text, finished = entry[0].snapshot()
+                    if text and text != entry[1]:
+                        slots[future].markdown(text)
+                        entry[1] = text
+                    if finished:
+                        del streams[future]
+                if not pending and streams:
+                    time.sleep(0.05)
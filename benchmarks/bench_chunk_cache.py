@@ -0,0 +1,93 @@
+"""
+块级 [CLS] 缓存对转发 / 近似重复新闻的效果：命中率、节省的编码时间，开关缓存的总耗时对比，
+以及复用 float16 缓存向量带来的概率偏差（相对关闭缓存时的全 float32 结果）。
+
+工作负载：先处理一批原文，再处理它们的三种转发版本——
+    platform  原文不变、换一个发布平台（预测缓存不命中，但所有块都能复用）
+    footer    末尾追加来源 / 免责声明（只有最后一块变化）
+    header    开头追加编者按（切块边界随之移动，通常只有长文章的后几块能复用）
+
+用法（在项目根目录）：python -m benchmarks.bench_chunk_cache --n 32 --chars 1500
+"""
+import argparse
+import time
+
+import predict_model
+from predict_model import chunk_cache_stats, load_model, predict_many, prediction_cache
+from benchmarks.synthetic import make_articles
+
+FOOTER = "（来源：某财经网。本文仅供参考，不构成投资建议，转载请注明出处。）"
+HEADER = "编者按：以下内容转载自网络，观点仅代表作者本人。"
+
+
+def make_reposts(articles):
+    return {
+        "platform": [(title, content, (code + 1) % 3) for title, content, code in articles],
+        "footer": [(title, content + FOOTER, code) for title, content, code in articles],
+        "header": [(title, HEADER + content, code) for title, content, code in articles],
+    }
+
+
+def run(articles, reposts, batch_size):
+    """依次处理原文和各组转发，返回 {组名: (耗时, 块级缓存命中率, 预测结果)}。"""
+    timings = {}
+    for name, batch in [("original", articles), *reposts.items()]:
+        before = chunk_cache_stats()
+        start = time.perf_counter()
+        results = predict_many(batch, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        after = chunk_cache_stats()
+        chunks = after["chunks"] - before["chunks"]
+        timings[name] = (elapsed, (after["cached"] - before["cached"]) / chunks if chunks else 0.0, results)
+    return timings
+
+
+def max_prob_delta(expected, actual):
+    """两组预测结果之间最大的概率绝对差，以及判别标签不一致的篇数。"""
+    delta = max((abs(p - q) for a, b in zip(expected, actual) for p, q in zip(a["prob"], b["prob"])), default=0.0)
+    flipped = sum(a["label"] != b["label"] for a, b in zip(expected, actual))
+    return delta, flipped
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=32, help="原文篇数")
+    parser.add_argument("--chars", type=int, default=1500, help="每篇正文字符数（越长块数越多）")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    articles = make_articles(args.n, num_chars=args.chars)
+    reposts = make_reposts(articles)
+    load_model()  # 冷启动不计入
+    cache = predict_model.chunk_cache
+
+    # 关闭块级缓存作为基线；两次运行都从空的预测缓存开始
+    prediction_cache.clear()
+    predict_model.chunk_cache = None
+    baseline = run(articles, reposts, args.batch_size)
+
+    prediction_cache.clear()
+    predict_model.chunk_cache = cache
+    if cache is not None:
+        cache.clear()
+    before = chunk_cache_stats()
+    cached = run(articles, reposts, args.batch_size)
+
+    print(f"{'组':<10}{'无缓存(s)':>12}{'有缓存(s)':>12}{'加速':>8}{'块命中率':>10}{'最大|Δp|':>12}{'标签变化':>8}")
+    for name in baseline:
+        t_base, _, expected = baseline[name]
+        t_cached, hit_rate, actual = cached[name]
+        delta, flipped = max_prob_delta(expected, actual)
+        print(f"{name:<10}{t_base:>12.2f}{t_cached:>12.2f}{t_base / t_cached:>7.2f}x{hit_rate:>10.1%}"
+              f"{delta:>12.2e}{flipped:>8}")
+
+    after = chunk_cache_stats()
+    chunks = after["chunks"] - before["chunks"]
+    reused = after["cached"] - before["cached"]
+    print(f"有缓存时累计: {chunks} 块，编码 {after['encoded'] - before['encoded']}，复用 {reused}，"
+          f"命中率 {reused / chunks if chunks else 0.0:.1%}，"
+          f"估计节省编码时间 {after['saved_encoder_seconds'] - before['saved_encoder_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
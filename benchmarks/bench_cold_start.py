@@ -0,0 +1,116 @@
+"""
+测量模型冷启动耗时与峰值内存（RSS）。每种方式在独立子进程中运行。
+
+  legacy : 旧流程，BertModel.from_pretrained + torch.hub 下载 .pt 后整体覆盖
+  current: predict_model.load_model()，按配置搭结构 + 本地 safetensors 内存映射加载
+
+用法（在项目根目录）：python -m benchmarks.bench_cold_start
+无网络环境下加 --synthetic：按 chinese-roberta-wwm-ext 的结构生成随机权重、配置和词表，
+放进临时的 HuggingFace 缓存目录，两种方式都离线加载同样大小的权重。
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _peak_rss_mb():
+    """
+    本进程的峰值 RSS（MB）。优先读 /proc/self/status 的 VmHWM：它随 exec 重置，
+    而 ru_maxrss 会带上父进程 fork 时的 RSS（--synthetic 下父进程刚生成过权重）。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(mode, legacy_pt=None):
+    start = time.perf_counter()
+    if mode == "legacy":
+        import torch
+        from model import DualInputFakeNewsClassifier
+        from predict_model import HF_MODEL_URL
+        model = DualInputFakeNewsClassifier()
+        if legacy_pt:
+            state_dict = torch.load(legacy_pt, map_location="cpu")
+        else:
+            state_dict = torch.hub.load_state_dict_from_url(HF_MODEL_URL, map_location="cpu", progress=False)
+        model.load_state_dict(state_dict)
+        model.eval()
+    else:
+        from predict_model import load_model
+        load_model()
+    seconds = time.perf_counter() - start
+    peak_mb = _peak_rss_mb()
+    print(json.dumps({"mode": mode, "seconds": round(seconds, 3), "peak_rss_mb": round(peak_mb, 1)}))
+
+
+def _make_synthetic(root):
+    """生成离线 HF 缓存（配置、词表、预训练权重）和微调权重（.pt 与 safetensors），返回子进程环境变量。"""
+    import torch
+    from safetensors.torch import save_file
+    from transformers import BertConfig, BertModel
+    from model import BERT_MODEL_NAME, DualInputFakeNewsClassifier
+
+    snapshot = os.path.join(root, "hub", "models--" + BERT_MODEL_NAME.replace("/", "--"), "snapshots", "synthetic")
+    os.makedirs(snapshot)
+    os.makedirs(os.path.join(root, "hub", "models--" + BERT_MODEL_NAME.replace("/", "--"), "refs"))
+    with open(os.path.join(snapshot, "..", "..", "refs", "main"), "w") as f:
+        f.write("synthetic")
+    # chinese-roberta-wwm-ext：12 层、768 维、词表 21128
+    config = BertConfig(vocab_size=21128)
+    config.save_pretrained(snapshot)
+    with open(os.path.join(snapshot, "vocab.txt"), "w", encoding="utf-8") as f:
+        specials = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+        f.write("\n".join(specials + [chr(0x4E00 + i) for i in range(config.vocab_size - len(specials))]))
+    BertModel(config).save_pretrained(snapshot)
+
+    state_dict = DualInputFakeNewsClassifier(bert_config=config).state_dict()
+    legacy_pt = os.path.join(root, "legacy.pt")
+    torch.save(state_dict, legacy_pt)
+    model_dir = os.path.join(root, "models")
+    os.makedirs(model_dir)
+    save_file({k: v.contiguous() for k, v in state_dict.items()},
+              os.path.join(model_dir, "best_fakenews_modelv3.safetensors"))
+    env = dict(os.environ, HF_HUB_CACHE=os.path.join(root, "hub"), HF_HUB_OFFLINE="1",
+               FAKENEWS_OFFLINE="1", FAKENEWS_MODEL_DIR=model_dir)
+    return env, legacy_pt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", choices=["legacy", "current"])
+    parser.add_argument("--modes", nargs="+", default=["legacy", "current"])
+    parser.add_argument("--synthetic", action="store_true", help="离线生成同结构的随机权重来测量")
+    parser.add_argument("--legacy-pt", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.legacy_pt)
+        return
+
+    env, extra = None, []
+    if args.synthetic:
+        tmp = tempfile.TemporaryDirectory()
+        env, legacy_pt = _make_synthetic(tmp.name)
+        extra = ["--legacy-pt", legacy_pt]
+
+    for mode in args.modes:
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_cold_start", "--child", mode, *extra],
+                             capture_output=True, text=True, check=True, env=env).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{result['mode']:>8}: 冷启动 {result['seconds']:.2f}s, 峰值 RSS {result['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
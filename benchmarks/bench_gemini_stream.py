@@ -0,0 +1,57 @@
+"""
+流式 vs 非流式 Gemini 调用：首个片段到达时间（TTFT）与总耗时，请求发往本地 SSE 桩服务器。
+
+用法（在项目根目录）：python -m benchmarks.bench_gemini_stream --chunks 40 --chunk-delay 0.05
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+os.environ.setdefault("TUSHARE_TOKEN", "offline")
+
+from predict_ai import GeminiClient
+from benchmarks.fakes import StubGeminiServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.3, help="首个片段之前的模拟处理时间（秒）")
+    parser.add_argument("--chunks", type=int, default=40, help="回答被切成的片段数")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="相邻片段间隔（秒）")
+    args = parser.parse_args()
+
+    reply = "### 核心新闻解读\n" + "公司基本面稳健，短期波动加大。" * 40
+    with StubGeminiServer(delay=args.delay, reply=reply, stream_chunks=args.chunks,
+                          chunk_delay=args.chunk_delay) as stub:
+        client = GeminiClient(url=stub.url)
+
+        blocking = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            text = client.generate(f"请求 {i}")
+            blocking.append(time.perf_counter() - start)
+
+        ttfts, totals = [], []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            first = None
+            deltas = []
+            for delta in client.stream_generate(f"请求 {i}"):
+                if first is None:
+                    first = time.perf_counter() - start
+                deltas.append(delta)
+            totals.append(time.perf_counter() - start)
+            ttfts.append(first)
+            assert "".join(deltas) == text
+
+    mean = lambda values: sum(values) / len(values)
+    print(f"非流式: 首字 = 总耗时 = {mean(blocking) * 1000:.0f} ms")
+    print(f"流式:   首字 {mean(ttfts) * 1000:.0f} ms，总耗时 {mean(totals) * 1000:.0f} ms，"
+          f"首字提前 {mean(blocking) / mean(ttfts):.1f}x")
+    print(f"客户端指标: {client.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
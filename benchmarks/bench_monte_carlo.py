@@ -0,0 +1,67 @@
+"""
+蒙特卡洛模拟：原逐日循环 vs 向量化引擎（float64 / float32）的每秒模拟路径数，
+并检查两者期末价格分布的统计一致性（均值、分位数、KS 统计量）。
+
+用法（在项目根目录）：python -m benchmarks.bench_monte_carlo --sims 100000 --days 365
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from plot_utils import _estimate_gbm_params, simulate_price_paths
+
+
+def legacy_price_paths(start_price, drift, stdev, sim_days, num_simulations):
+    """原 run_monte_carlo_simulation 中的实现（全局随机状态 + Python 循环）。"""
+    daily_returns = np.exp(drift + stdev * np.random.standard_normal((sim_days, num_simulations)))
+    price_paths = np.zeros_like(daily_returns)
+    price_paths[0] = start_price
+    for t in range(1, sim_days):
+        price_paths[t] = price_paths[t - 1] * daily_returns[t]
+    return price_paths
+
+
+def make_history(days=365, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, days)))
+    return pd.DataFrame({"trade_date": pd.date_range("2024-01-01", periods=days), "close": close})
+
+
+def _ks_statistic(a, b):
+    grid = np.sort(np.concatenate([a, b]))
+    cdf_a = np.searchsorted(np.sort(a), grid, side="right") / len(a)
+    cdf_b = np.searchsorted(np.sort(b), grid, side="right") / len(b)
+    return np.max(np.abs(cdf_a - cdf_b))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sims", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    hist = make_history()
+    drift, stdev = _estimate_gbm_params(hist)
+    start_price = hist["close"].iloc[-1]
+
+    np.random.seed(0)
+    start = time.perf_counter()
+    legacy = legacy_price_paths(start_price, drift, stdev, args.days, args.sims)
+    t_legacy = time.perf_counter() - start
+    print(f"{'legacy':>8}: {args.sims / t_legacy:12,.0f} 条路径/秒")
+
+    for dtype in (np.float64, np.float32):
+        start = time.perf_counter()
+        paths = simulate_price_paths(start_price, drift, stdev, args.days, args.sims, seed=1, dtype=dtype)
+        seconds = time.perf_counter() - start
+        end_new, end_old = paths[-1].astype(np.float64), legacy[-1]
+        print(f"{np.dtype(dtype).name:>8}: {args.sims / seconds:12,.0f} 条路径/秒, 加速 {t_legacy / seconds:5.1f}x, "
+              f"均值 {end_new.mean():.4f} vs {end_old.mean():.4f}, "
+              f"中位数 {np.median(end_new):.4f} vs {np.median(end_old):.4f}, "
+              f"KS {_ks_statistic(end_new, end_old):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+流式蒙特卡洛：耗时、峰值内存，以及与完整路径精确分位数的误差。
+
+用法（在项目根目录）：python -m benchmarks.bench_monte_carlo_streaming --sims 1000000 --days 365 --workers 4
+"""
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from plot_utils import run_monte_carlo_simulation, run_monte_carlo_streaming
+from benchmarks.bench_monte_carlo import make_history
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sims", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--check-sims", type=int, default=50_000, help="与精确分位数对比时使用的模拟次数")
+    args = parser.parse_args()
+
+    hist = make_history()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    summary = run_monte_carlo_streaming(hist, sim_days=args.days, num_simulations=args.sims,
+                                        seed=0, workers=args.workers)
+    seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"流式: {args.sims:,} 条路径 × {args.days} 天, {seconds:.2f}s ({args.sims / seconds:,.0f} 条/秒), "
+          f"主进程峰值 RSS 增量 {rss_after - rss_before:.0f} MB, prob_higher={summary.prob_higher:.4f}")
+
+    # 精度：与完整路径的精确分位数比较（相对误差）
+    exact_df, _ = run_monte_carlo_simulation(hist, sim_days=args.days, num_simulations=args.check_sims, seed=1)
+    approx = run_monte_carlo_streaming(hist, sim_days=args.days, num_simulations=args.check_sims, seed=1)
+    levels = (5, 25, 50, 75, 95)
+    exact = np.percentile(exact_df.to_numpy(), levels, axis=1)
+    sketch = approx.quantiles(levels)
+    for q, row in zip(levels, exact):
+        rel = np.max(np.abs(sketch[q] - row) / row)
+        print(f"  P{q:<2d} 最大相对误差: {rel:.4%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+蒙特卡洛图的 Plotly 负载体积与渲染（构建 + JSON 序列化）耗时："paths" 意大利面图 vs "fan" 扇形图。
+
+用法（在项目根目录）：python -m benchmarks.bench_plot_monte_carlo --sims 1000 --days 90
+"""
+import argparse
+import time
+
+from plot_utils import plot_monte_carlo, run_monte_carlo_simulation
+from benchmarks.bench_monte_carlo import make_history
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sims", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    hist = make_history()
+    sim_df, end_prices = run_monte_carlo_simulation(hist, sim_days=args.days, num_simulations=args.sims, seed=0)
+    start_price = hist["close"].iloc[-1]
+
+    for mode in ("paths", "fan"):
+        start = time.perf_counter()
+        fig, prob_higher = plot_monte_carlo(sim_df, end_prices, start_price, mode=mode)
+        t_build = time.perf_counter() - start
+        start = time.perf_counter()
+        payload = fig.to_json()
+        t_json = time.perf_counter() - start
+        print(f"{mode:>6}: {len(fig.data):5d} 个 trace, 负载 {len(payload) / 1024 / 1024:7.2f} MB, "
+              f"构建 {t_build * 1000:8.1f} ms, 序列化 {t_json * 1000:8.1f} ms, prob_higher={prob_higher:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+对比逐篇 predict_by_model 与批量 predict_many 的吞吐量。
+
+用法（在项目根目录）：python -m benchmarks.bench_predict_many --n 64 --chars 300
+"""
+import argparse
+import time
+
+from predict_model import load_model, predict_by_model, predict_many, prediction_cache
+from benchmarks.synthetic import make_articles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=64, help="文章数")
+    parser.add_argument("--chars", type=int, default=300, help="每篇正文字符数")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    articles = make_articles(args.n, num_chars=args.chars)
+    load_model()  # 冷启动不计入
+
+    # 两种方式都从空缓存开始，避免命中预测缓存
+    prediction_cache.clear()
+    start = time.perf_counter()
+    single = [predict_by_model(title, content, code) for title, content, code in articles]
+    t_single = time.perf_counter() - start
+
+    prediction_cache.clear()
+    start = time.perf_counter()
+    batched = predict_many(articles, batch_size=args.batch_size)
+    t_batch = time.perf_counter() - start
+
+    agree = sum(s[0] == b["label"] for s, b in zip(single, batched)) / len(articles)
+    max_delta = max(abs(s[1][1] - b["prob"][1]) for s, b in zip(single, batched))
+    print(f"逐篇: {t_single:.2f}s  ({len(articles) / t_single:.2f} 篇/秒)")
+    print(f"批量: {t_batch:.2f}s  ({len(articles) / t_batch:.2f} 篇/秒)  加速 {t_single / t_batch:.2f}x")
+    print(f"标签一致率: {agree:.2%}  最大概率差: {max_delta:.2e}")
+
+
+if __name__ == "__main__":
+    main()
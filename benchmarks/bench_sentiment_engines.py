@@ -0,0 +1,83 @@
+"""
+jieba 引擎与 Aho-Corasick（aho）引擎的吞吐量对比与一致性报告。
+
+语料可以是合成新闻，也可以是一个 JSON Lines 文件（每行包含 title、content 字段）。
+报告：两种引擎的篇/秒、Pearson 相关系数、平均/最大绝对差、情感倾向（积极/中性/消极，
+阈值与 app.py 一致）一致率，以及在该语料上校准出的 AHO_CHARS_PER_TOKEN 建议值。
+
+用法（在项目根目录）：python -m benchmarks.bench_sentiment_engines --n 2000
+                      python -m benchmarks.bench_sentiment_engines --corpus news.jsonl
+"""
+import argparse
+import json
+import re
+import time
+
+import jieba
+import numpy as np
+
+import sentiment_analyzer
+from sentiment_analyzer import score_articles
+from benchmarks.synthetic import make_articles
+
+
+def _load_corpus(args):
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [r["title"] for r in rows], [r["content"] for r in rows]
+    articles = make_articles(args.n, num_chars=args.chars)
+    return [a[0] for a in articles], [a[1] for a in articles]
+
+
+def _polarity(scores):
+    return np.where(scores > 0.02, 1, np.where(scores < -0.02, -1, 0))
+
+
+def _calibrate_chars_per_token(texts):
+    """在语料上估计：未命中词典的汉字数 / 对应的 jieba 词数。"""
+    matcher = sentiment_analyzer._get_lexicon_matcher()
+    chars = words = 0
+    for text in texts:
+        tokens = sentiment_analyzer._segment_for_sentiment(text)
+        cleaned = re.sub(r'[^一-龥a-zA-Z0-9]', '', text)
+        pos, neg, covered = matcher.scan(cleaned)
+        alnum_runs = len(re.findall(r'[a-zA-Z0-9]+', cleaned))
+        chars += len(re.findall(r'[一-龥]', cleaned)) - covered
+        words += len(tokens) - pos - neg - alnum_runs
+    return chars / words if words > 0 else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="JSON Lines 语料文件")
+    parser.add_argument("--n", type=int, default=2000, help="合成语料篇数")
+    parser.add_argument("--chars", type=int, default=500, help="合成语料每篇字符数")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    titles, contents = _load_corpus(args)
+    sentiment_analyzer._load_resources()
+    sentiment_analyzer._get_lexicon_matcher()
+    jieba.initialize()
+
+    timings = {}
+    scores = {}
+    for engine in ("jieba", "aho"):
+        start = time.perf_counter()
+        scores[engine] = score_articles(titles, contents, workers=args.workers, engine=engine)
+        timings[engine] = time.perf_counter() - start
+        print(f"{engine:>6}: {len(titles) / timings[engine]:8.1f} 篇/秒")
+
+    ref, alt = scores["jieba"], scores["aho"]
+    diff = np.abs(ref - alt)
+    corr = np.corrcoef(ref, alt)[0, 1] if ref.std() > 0 and alt.std() > 0 else float("nan")
+    print(f"加速: {timings['jieba'] / timings['aho']:.1f}x")
+    print(f"Pearson 相关: {corr:.4f}  平均绝对差: {diff.mean():.4f}  最大绝对差: {diff.max():.4f}")
+    print(f"情感倾向一致率: {np.mean(_polarity(ref) == _polarity(alt)):.2%}")
+    print(f"建议 SENTIMENT_AHO_CHARS_PER_TOKEN ≈ {_calibrate_chars_per_token(titles + contents):.2f}"
+          f"（当前 {sentiment_analyzer.AHO_CHARS_PER_TOKEN}）")
+
+
+if __name__ == "__main__":
+    main()
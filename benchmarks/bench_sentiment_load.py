@@ -0,0 +1,53 @@
+"""
+测量情感分析首次调用延迟（含资源加载）：解析 xlsx vs 读取预编译产物。
+每种方式在独立子进程中运行，保证是真正的“首次调用”。
+
+用法（在项目根目录）：python -m benchmarks.bench_sentiment_load
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TITLE = "贵州茅台发布年度财报，净利润同比增长"
+CONTENT = "公司业绩超预期，市场信心回升。但原材料价格上涨，成本压力加大，存在一定风险。"
+
+
+def _child(mode, artifact_path):
+    start = time.perf_counter()
+    import sentiment_analyzer
+    sentiment_analyzer.LEXICON_ARTIFACT_PATH = artifact_path
+    if mode == "xlsx":
+        # 旧流程：直接解析 xlsx，不读也不写产物
+        sentiment_analyzer._sentiment_resources = sentiment_analyzer._read_sources()
+    sentiment_analyzer.get_article_sentiment(TITLE, CONTENT)
+    print(json.dumps({"mode": mode, "seconds": round(time.perf_counter() - start, 3)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", choices=["xlsx", "artifact"])
+    parser.add_argument("--artifact")
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.artifact)
+        return
+
+    from sentiment_analyzer import build_lexicon_artifact
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact_path = os.path.join(tmp, "sentiment_lexicon.json")
+        build_lexicon_artifact(artifact_path)
+        for mode in ("xlsx", "artifact"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_sentiment_load", "--child", mode, "--artifact", artifact_path],
+                capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{result['mode']:>8}: 首次调用 {result['seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
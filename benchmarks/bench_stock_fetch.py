@@ -0,0 +1,60 @@
+"""
+多股票日线拉取：逐只串行 vs get_stock_data_many 并发（含限流与重试），全部使用本地 FakeTushareDaily。
+
+用法（在项目根目录）：python -m benchmarks.bench_stock_fetch --codes 40 --latency 0.3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from stock_data import DailyBarCache, RateLimitedFetcher, TokenBucket, fetch_stock_data, get_stock_data_many
+from benchmarks.fakes import FakeTushareDaily
+
+
+def _make_cache(tmp, name, args):
+    fake = FakeTushareDaily(latency=args.latency, quota_per_minute=args.quota, error_rate=args.error_rate)
+    fetcher = RateLimitedFetcher(fake, TokenBucket.per_minute(args.quota), backoff=0.2)
+    return fake, DailyBarCache(path=os.path.join(tmp, name), fetch_fn=fetcher)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--codes", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3, help="每次调用的模拟延迟（秒）")
+    parser.add_argument("--quota", type=int, default=500, help="模拟的每分钟配额")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="模拟瞬时错误概率")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    codes = [f"{600000 + i:06d}.SH" for i in range(args.codes)]
+    end_date = "2024-06-10"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fake, cache = _make_cache(tmp, "serial.sqlite", args)
+        start = time.perf_counter()
+        failed = 0
+        for code in codes:
+            try:
+                fetch_stock_data(code, end_date, 365, cache)
+            except Exception:
+                failed += 1
+        t_serial = time.perf_counter() - start
+        print(f"串行: {t_serial:.2f}s, 调用 {len(fake.calls)} 次, 失败 {failed} 只")
+
+        fake, cache = _make_cache(tmp, "many.sqlite", args)
+        start = time.perf_counter()
+        data, errors = get_stock_data_many(codes, end_date, 365, max_workers=args.workers, cache=cache)
+        t_many = time.perf_counter() - start
+        print(f"并发: {t_many:.2f}s, 调用 {len(fake.calls)} 次, 成功 {len(data)} 只, 失败 {len(errors)} 只, "
+              f"配额错误 {fake.quota_errors} 次, 瞬时错误 {fake.transient_errors} 次, 加速 {t_serial / t_many:.1f}x")
+        for code, message in errors.items():
+            print(f"  {code}: {message}")
+
+        start = time.perf_counter()
+        get_stock_data_many(codes, end_date, 365, max_workers=args.workers, cache=cache)
+        print(f"缓存命中后再次并发拉取: {time.perf_counter() - start:.2f}s, 累计调用 {len(fake.calls)} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+tracing 的开销：关闭 / 开启时每个 span 与 traced 调用额外花费的时间（纳秒）。
+
+用法（在项目根目录）：python -m benchmarks.bench_tracing_overhead --n 1000000
+"""
+import argparse
+import time
+
+import tracing
+
+
+def _noop():
+    return None
+
+
+def _per_call_ns(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    decorated = tracing.traced("bench.decorated")(_noop)
+
+    def with_span():
+        with tracing.span("bench.span"):
+            pass
+
+    baseline = _per_call_ns(_noop, args.n)
+    for enabled in (False, True):
+        tracing.enable(enabled)
+        tracing.reset()
+        span_ns = _per_call_ns(with_span, args.n) - baseline
+        traced_ns = _per_call_ns(decorated, args.n) - baseline
+        state = "开启" if enabled else "关闭"
+        print(f"tracing {state}: span +{span_ns:.0f} ns/次，traced +{traced_ns:.0f} ns/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+推理进程池从 1 到 N 个进程的吞吐量与内存扩展情况。
+
+每种进程数新建一个 InferenceWorkerPool（每进程线程数 = CPU 核数 // 进程数），先预热，再计时判别一批新文章。
+内存读取 /proc/<pid>/smaps_rollup（仅 Linux），统计本进程、forkserver（持有预加载的模型）和全部推理进程：
+    RSS 之和  把共享页重复计入，相当于“N 个独立进程各加载一份模型”的上限
+    PSS 之和  共享页按进程数均摊，是整组进程实际占用的物理内存
+两者差距越大，说明 fork 后共享的权重越多。
+
+默认关闭预测缓存和块级 [CLS] 缓存，测的是编码吞吐；指定 --cache-dir 时改为打开两者并落盘到该目录，
+用来检查多个进程同时读写 SQLite 缓存（每轮的文章不同，不会命中）。
+
+用法（在项目根目录）：python -m benchmarks.bench_worker_pool --workers 1 2 4 8 --n 64 --chars 1000
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.synthetic import make_articles
+
+
+def _memory_mb(pid):
+    """(RSS, PSS)，单位 MB。"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values["Rss:"], values["Pss:"]
+
+
+def _parent_pid(pid):
+    with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+        # 第 2 个字段（进程名）可能含空格，从右括号之后开始数
+        return int(f.read().rsplit(")", 1)[1].split()[1])
+
+
+def _default_worker_counts():
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=_default_worker_counts(), help="要测试的进程数")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="默认 CPU 核数 // 进程数")
+    parser.add_argument("--n", type=int, default=64, help="每轮计时的文章数")
+    parser.add_argument("--chars", type=int, default=1000, help="每篇正文字符数")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--cache-dir", help="打开预测缓存和块级缓存，SQLite 文件放在该目录")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    # 缓存配置在导入 predict_model 之前设置，forkserver 和推理进程都会继承
+    if args.cache_dir:
+        os.environ["FAKENEWS_PREDICT_CACHE_DB"] = os.path.join(args.cache_dir, "predictions.sqlite")
+        os.environ["FAKENEWS_CHUNK_CACHE_DB"] = os.path.join(args.cache_dir, "chunks.sqlite")
+    else:
+        os.environ.setdefault("FAKENEWS_PREDICT_CACHE_SIZE", "0")
+        os.environ.setdefault("FAKENEWS_CHUNK_CACHE_SIZE", "0")
+    from worker_pool import InferenceWorkerPool
+
+    results = []
+    print(f"{'进程':>4}{'线程/进程':>10}{'篇/秒':>10}{'加速':>8}{'RSS之和(MB)':>14}{'PSS之和(MB)':>14}")
+    for round_index, num_workers in enumerate(args.workers):
+        # 每轮使用不同的文章，即使缓存被重新打开也不会命中上一轮的结果
+        warmup = make_articles(num_workers * 2, num_chars=args.chars, seed=1000 + round_index)
+        articles = make_articles(args.n, num_chars=args.chars, seed=round_index)
+        with InferenceWorkerPool(num_workers, args.threads_per_worker) as pool:
+            pool.predict_many(warmup, batch_size=args.batch_size)
+            start = time.perf_counter()
+            pool.predict_many(articles, batch_size=args.batch_size)
+            seconds = time.perf_counter() - start
+            worker_pids = pool.pids()
+            memory = [_memory_mb(pid) for pid in [os.getpid(), _parent_pid(worker_pids[0]), *worker_pids]]
+            threads = pool.threads_per_worker
+
+        entry = {
+            "workers": num_workers, "threads_per_worker": threads, "articles": args.n,
+            "seconds": seconds, "articles_per_second": args.n / seconds,
+            "rss_sum_mb": sum(rss for rss, _ in memory), "pss_sum_mb": sum(pss for _, pss in memory),
+            "parent_rss_mb": memory[0][0],
+        }
+        entry["speedup"] = entry["articles_per_second"] / results[0]["articles_per_second"] if results else 1.0
+        results.append(entry)
+        print(f"{num_workers:>4}{threads:>10}{entry['articles_per_second']:>10.2f}{entry['speedup']:>7.2f}x"
+              f"{entry['rss_sum_mb']:>14.0f}{entry['pss_sum_mb']:>14.0f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "cpus": os.cpu_count(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+比较各推理后端与 eager fp32 基准在固定样本集上的一致性与速度。
+
+输出：标签一致率、真实类概率的最大偏差、吞吐量。
+用法（在项目根目录）：python -m benchmarks.check_backend_parity --backends int8 torchscript
+"""
+import argparse
+import time
+
+from predict_model import INFERENCE_BACKENDS, load_model, predict_many, prediction_cache
+from benchmarks.synthetic import make_articles
+
+
+def _timed_predict(articles, backend, batch_size):
+    load_model(backend)  # 加载 / 量化 / 导出不计入
+    prediction_cache.clear()
+    start = time.perf_counter()
+    results = predict_many(articles, batch_size=batch_size, backend=backend)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=[b for b in INFERENCE_BACKENDS if b != "eager"])
+    parser.add_argument("--n", type=int, default=64, help="样本数（固定随机种子）")
+    parser.add_argument("--chars", type=int, default=600)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    articles = make_articles(args.n, num_chars=args.chars, seed=2024)
+    reference, t_ref = _timed_predict(articles, "eager", args.batch_size)
+    print(f"{'eager':>12}: {len(articles) / t_ref:6.2f} 篇/秒 (基准)")
+
+    for backend in args.backends:
+        results, seconds = _timed_predict(articles, backend, args.batch_size)
+        agree = sum(r["label"] == c["label"] for r, c in zip(reference, results)) / len(articles)
+        max_delta = max(abs(r["prob"][1] - c["prob"][1]) for r, c in zip(reference, results))
+        print(f"{backend:>12}: {len(articles) / seconds:6.2f} 篇/秒, 加速 {t_ref / seconds:.2f}x, "
+              f"标签一致率 {agree:.2%}, 最大概率差 {max_delta:.4f}")
+
+
+if __name__ == "__main__":
+    main()
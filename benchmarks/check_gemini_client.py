@@ -0,0 +1,107 @@
+"""
+GeminiClient 行为检查与延迟对比，全部请求发往本地 StubGeminiServer，不访问网络。
+
+检查项：连接复用、429/5xx 重试（含 Retry-After）、读超时不挂起、并发上限、重试耗尽后报错、
+API key 只放在请求头里且不出现在错误信息中。
+用法（在项目根目录）：python -m benchmarks.check_gemini_client --requests 50 --delay 0.02
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+os.environ.setdefault("TUSHARE_TOKEN", "offline")
+
+from predict_ai import GeminiClient, GeminiError
+from benchmarks.fakes import StubGeminiServer
+
+
+def _payload(i):
+    return {"contents": [{"parts": [{"text": f"请求 {i}"}]}]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02, help="桩服务器每个请求的处理延迟（秒）")
+    args = parser.parse_args()
+
+    # 1. 每次新建连接（原实现） vs 连接池
+    with StubGeminiServer(delay=args.delay) as stub:
+        start = time.perf_counter()
+        for i in range(args.requests):
+            requests.post(stub.url, json=_payload(i), headers={"Connection": "close"})
+        t_plain = time.perf_counter() - start
+        plain_conns = len(stub.connections)
+
+    with StubGeminiServer(delay=args.delay) as stub:
+        client = GeminiClient(url=stub.url)
+        start = time.perf_counter()
+        for i in range(args.requests):
+            client.generate(f"请求 {i}")
+        t_pooled = time.perf_counter() - start
+        print(f"串行 {args.requests} 次: 每次新连接 {t_plain:.2f}s ({plain_conns} 个连接), "
+              f"连接池 {t_pooled:.2f}s ({len(stub.connections)} 个连接)")
+        print(f"  延迟指标: {client.metrics()}")
+
+    # 2. 429/5xx 重试，429 带 Retry-After
+    with StubGeminiServer(failures=[503, 429, 502], retry_after=1) as stub:
+        client = GeminiClient(url=stub.url, backoff=0.05)
+        start = time.perf_counter()
+        text = client.generate("重试")
+        elapsed = time.perf_counter() - start
+        assert stub.requests == 4 and client.retries == 3, (stub.requests, client.retries)
+        assert elapsed >= 1.0, "应遵守 Retry-After"
+        print(f"重试: 3 次失败后成功，耗时 {elapsed:.2f}s，返回 {text!r}")
+
+    # 3. 重试耗尽
+    with StubGeminiServer(failures=[500] * 10) as stub:
+        client = GeminiClient(url=stub.url, max_retries=2, backoff=0.01)
+        try:
+            client.generate("失败")
+            raise AssertionError("应抛出 GeminiError")
+        except GeminiError as e:
+            assert stub.requests == 3
+            print(f"重试耗尽: {e}")
+
+    # 4. 读超时：服务器挂起时在超时后返回，而不是无限等待
+    with StubGeminiServer(failures=["hang"] * 10, hang_seconds=3) as stub:
+        client = GeminiClient(url=stub.url, read_timeout=0.3, max_retries=1, backoff=0.01)
+        start = time.perf_counter()
+        try:
+            client.generate("超时")
+            raise AssertionError("应抛出 GeminiError")
+        except GeminiError:
+            elapsed = time.perf_counter() - start
+            assert elapsed < 2, elapsed
+            print(f"读超时: {elapsed:.2f}s 后放弃（服务器挂起 3s）")
+
+    # 5. 并发上限
+    with StubGeminiServer(delay=0.1) as stub:
+        client = GeminiClient(url=stub.url, max_concurrency=3)
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            list(pool.map(client.generate, [f"并发 {i}" for i in range(24)]))
+        assert stub.max_in_flight <= 3, stub.max_in_flight
+        print(f"并发上限 3: 服务器观察到的最大并发 {stub.max_in_flight}，连接数 {len(stub.connections)}")
+        print(f"  延迟指标: {client.metrics()}")
+
+    # 6. API key 走请求头；连接失败时错误信息里不带 key
+    with StubGeminiServer() as stub:
+        client = GeminiClient(url=stub.url, api_key="secret-key")
+        client.generate("鉴权")
+        assert stub.api_keys == {"secret-key"} and "key" not in client.url, (stub.api_keys, client.url)
+        url = stub.url
+    client = GeminiClient(url=url, api_key="secret-key", max_retries=0)
+    try:
+        client.generate("连接失败")
+        raise AssertionError("应抛出 GeminiError")
+    except GeminiError as e:
+        assert "secret-key" not in str(e), str(e)
+        print(f"API key 只在请求头中，连接失败的错误信息: {e}")
+
+
+if __name__ == "__main__":
+    main()
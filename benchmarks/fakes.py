@@ -0,0 +1,242 @@
+"""
+外部依赖的本地替身，基准测试和手工验证时使用，不访问网络。
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from stock_data import BAR_COLUMNS
+
+
+class FakeTushareDaily:
+    """
+    模拟 Tushare 日线接口，按股票代码生成确定性的工作日日线，并记录调用次数。
+    签名为 fetch_fn(ts_code, start_date, end_date)，可直接用于 DailyBarCache / RateLimitedFetcher。
+
+    默认行为与 pro.daily 一致：超出配额时抛出与真实接口相同文案的异常，网络超时抛出 TimeoutError。
+    swallow_errors=True 时模拟 ts.pro_bar：捕获这些异常、打印后返回 None。
+
+    Args:
+        latency (float): 每次调用的模拟网络延迟（秒）。
+        quota_per_minute (int): 模拟每个配额窗口内允许的调用次数。
+        error_rate (float): 随机出现网络超时（瞬时错误）的概率。
+        window (float): 配额窗口长度（秒），真实接口为 60；测试时可以调小。
+        fail_codes (dict): 股票代码 -> 异常，这些代码每次调用都抛出该异常（模拟代码无效等永久错误）。
+        swallow_errors (bool): 是否像 ts.pro_bar 一样吞掉异常并返回 None。
+    """
+
+    def __init__(self, latency=0.0, quota_per_minute=None, error_rate=0.0, seed=0, window=60.0,
+                 fail_codes=None, swallow_errors=False):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.window = window
+        self.fail_codes = dict(fail_codes or {})
+        self.swallow_errors = swallow_errors
+        self.calls = []
+        self.quota_errors = 0
+        self.transient_errors = 0
+        self._recent = deque()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, ts_code, start_date, end_date):
+        try:
+            return self._daily(ts_code, start_date, end_date)
+        except Exception as e:
+            if not self.swallow_errors:
+                raise
+            print(e)
+            return None
+
+    def _daily(self, ts_code, start_date, end_date):
+        with self._lock:
+            now = time.monotonic()
+            self.calls.append((ts_code, start_date, end_date))
+            if ts_code in self.fail_codes:
+                raise self.fail_codes[ts_code]
+            while self._recent and now - self._recent[0] > self.window:
+                self._recent.popleft()
+            if self.quota_per_minute is not None and len(self._recent) >= self.quota_per_minute:
+                self.quota_errors += 1
+                raise Exception(f"抱歉，您每分钟最多访问该接口{self.quota_per_minute}次")
+            self._recent.append(now)
+            fail = self._rng.random() < self.error_rate
+        time.sleep(self.latency)
+        if fail:
+            with self._lock:
+                self.transient_errors += 1
+            raise TimeoutError("模拟网络超时")
+        return make_daily_bars(ts_code, start_date, end_date)
+
+
+def make_daily_bars(ts_code, start_date, end_date):
+    """生成 [start_date, end_date]（'YYYYMMDD'）内工作日的日线，列与 ts.pro_bar 一致，按日期降序。"""
+    start = datetime.strptime(start_date, '%Y%m%d')
+    end = datetime.strptime(end_date, '%Y%m%d')
+    days = pd.bdate_range(start, end)
+    if len(days) == 0:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+
+    # 价格只取决于股票代码和日期，保证分段拉取与整段拉取结果一致
+    origin = datetime(2000, 1, 3)
+    offsets = np.array([(d - origin).days for d in days])
+    seed = sum(ord(ch) for ch in ts_code)
+    close = 10 + 2 * np.sin(offsets / 30 + seed) + 0.01 * (offsets % 97)
+    pre_close = 10 + 2 * np.sin((offsets - 1) / 30 + seed) + 0.01 * ((offsets - 1) % 97)
+    df = pd.DataFrame({
+        "ts_code": ts_code,
+        "trade_date": [d.strftime('%Y%m%d') for d in days],
+        "open": pre_close,
+        "high": np.maximum(close, pre_close) * 1.01,
+        "low": np.minimum(close, pre_close) * 0.99,
+        "close": close,
+        "pre_close": pre_close,
+        "change": close - pre_close,
+        "pct_chg": (close - pre_close) / pre_close * 100,
+        "vol": 1e5 + (offsets % 13) * 1e4,
+        "amount": 1e6 + (offsets % 7) * 1e5,
+    })
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+
+def _candidate(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+
+class StubGeminiServer:
+    """
+    本地 Gemini generateContent / streamGenerateContent（SSE）桩服务器（HTTP/1.1 keep-alive），可模拟延迟和失败。
+
+    Args:
+        delay (float): 每个请求的处理延迟（秒），流式请求即首个片段之前的等待。
+        stream_chunks (int): 流式响应把回答切成的片段数。
+        chunk_delay (float): 流式响应相邻片段之间的间隔（秒），非流式请求会等待全部片段生成完（模拟整段生成时间）。
+        failures (list): 依次消费的失败脚本，元素为 HTTP 状态码（如 429、503）
+            或 "hang"（sleep hang_seconds 后再正常返回，用于触发读超时）；耗尽后一律返回 200。
+        retry_after (int): 429 响应携带的 Retry-After 秒数，None 表示不带。
+
+    用法：
+        with StubGeminiServer(delay=0.05, failures=[503, 429]) as stub:
+            client = GeminiClient(url=stub.url)
+    """
+
+    def __init__(self, delay=0.0, failures=None, retry_after=None, hang_seconds=5.0, reply="[A] 具有参考价值",
+                 stream_chunks=1, chunk_delay=0.0):
+        self.delay = delay
+        self.stream_chunks = stream_chunks
+        self.chunk_delay = chunk_delay
+        self.failures = deque(failures or [])
+        self.retry_after = retry_after
+        self.hang_seconds = hang_seconds
+        self.reply = reply
+        self.requests = 0
+        self.api_keys = set()   # 请求头 x-goog-api-key 中出现过的值
+        self.connections = set()   # 不同的客户端端口数，反映连接是否被复用
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1beta/models/stub:generateContent"
+
+    def _next_failure(self):
+        with self._lock:
+            self.requests += 1
+            return self.failures.popleft() if self.failures else None
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True   # 头和正文分两次写出，避免与延迟 ACK 叠加出 40ms 等待
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.api_keys.add(self.headers.get("x-goog-api-key"))
+                    stub.connections.add(self.client_address)
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                try:
+                    failure = stub._next_failure()
+                    time.sleep(stub.delay)
+                    if failure == "hang":
+                        time.sleep(stub.hang_seconds)
+                    elif failure is not None:
+                        headers = {"Retry-After": str(stub.retry_after)} if failure == 429 and stub.retry_after else {}
+                        self._send(failure, {"error": {"code": failure, "message": "stub failure"}}, headers)
+                        return
+                    prompt = payload["contents"][0]["parts"][0]["text"]
+                    text = f"{stub.reply}（{len(prompt)} 字）"
+                    if "streamGenerateContent" in self.path:
+                        self._send_stream(text)
+                    else:
+                        time.sleep(stub.chunk_delay * max(stub.stream_chunks - 1, 0))
+                        self._send(200, _candidate(text))
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+
+            def _send_stream(self, text):
+                # 与 Gemini 一致：分块传输编码（chunked）的 SSE 响应，每个事件一个块
+                self.send_response(200)
+                # 不声明 charset（不能依赖服务端带上），客户端需要自己按 UTF-8 解码
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                n = max(stub.stream_chunks, 1)
+                step = -(-len(text) // n)
+                for i in range(0, len(text), step):
+                    if i:
+                        time.sleep(stub.chunk_delay)
+                    event = json.dumps(_candidate(text[i:i + step]), ensure_ascii=False)
+                    data = f"data: {event}\r\n\r\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
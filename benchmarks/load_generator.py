@@ -0,0 +1,89 @@
+"""
+inference_server 的压测脚本：在不同并发度下发送合成新闻，输出吞吐与 p50/p99 延迟。
+
+每条请求的文章都不同，避免命中预测缓存。先启动服务：
+    python inference_server.py --port 8000
+再运行（在项目根目录）：
+    python -m benchmarks.load_generator --url http://127.0.0.1:8000 --concurrency 1 4 16 64 --requests 400
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic import make_articles
+
+
+def _percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+class _Connection(threading.local):
+    """每个压测线程一个 keep-alive 连接。"""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+
+
+def _request(conn, method, path, body=None):
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+    conn.request(method, path, data, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    payload = json.loads(response.read())
+    return response.status, payload
+
+
+def run_level(url, articles, concurrency):
+    parsed = urllib.parse.urlparse(url)
+    local = _Connection(parsed.hostname, parsed.port)
+
+    def one(article):
+        title, content, platform_code = article
+        start = time.perf_counter()
+        status, _ = _request(local.conn, "POST", "/predict",
+                             {"title": title, "content": content, "platform_code": platform_code})
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, articles))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for status, latency in outcomes if status == 200)
+    failures = sum(status != 200 for status, _ in outcomes)
+    return {
+        "concurrency": concurrency, "requests": len(articles), "failures": failures,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.5) * 1000, "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=400, help="每个并发度发送的请求数")
+    parser.add_argument("--chars", type=int, default=300)
+    args = parser.parse_args()
+
+    parsed = urllib.parse.urlparse(args.url)
+    status, health = _request(http.client.HTTPConnection(parsed.hostname, parsed.port), "GET", "/health")
+    print(f"服务状态: {status} {health}")
+
+    print(f"{'并发':>6} {'吞吐(req/s)':>12} {'p50(ms)':>10} {'p99(ms)':>10} {'失败':>6}")
+    for seed, concurrency in enumerate(args.concurrency):
+        # 每个并发度使用不同的随机种子，保证文章不重复
+        articles = make_articles(args.requests, num_chars=args.chars, seed=1000 + seed)
+        result = run_level(args.url, articles, concurrency)
+        print(f"{concurrency:>6} {result['throughput_rps']:>12.1f} {result['p50_ms']:>10.1f} "
+              f"{result['p99_ms']:>10.1f} {result['failures']:>6}")
+
+    _, metrics = _request(http.client.HTTPConnection(parsed.hostname, parsed.port), "GET", "/metrics")
+    print(f"服务端批处理指标: {json.dumps(metrics['batcher'], ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
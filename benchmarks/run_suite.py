@@ -0,0 +1,269 @@
+"""
+端到端基准测试套件：分别计时各个环节，结果输出为 JSON，便于比较不同版本。
+
+环节：
+    chunking       split_text_into_chunks（离线 tokenizer，按合成词表按字切分）
+    sentiment      get_article_sentiment（jieba / aho 两种引擎）
+    model_forward  随机初始化的 DualInputFakeNewsClassifier 前向（单篇 4×512 与批量动态 padding）
+    monte_carlo    run_monte_carlo_simulation
+    plot           plot_monte_carlo 生成图表并序列化为 JSON（Streamlit 传给前端的就是它）
+    stock_data     fetch_stock_data + DailyBarCache，对接本地 FakeTushareDaily（冷缓存 / 热缓存）
+    gemini         gemini_prompt，对接本地 StubGeminiServer（未命中 / 命中响应缓存）
+
+全程不访问网络：tokenizer 由合成词表构造，模型随机初始化，Tushare 与 Gemini 使用本地替身。
+
+用法（在项目根目录）：
+    python -m benchmarks.run_suite --chars 300 1000 3000 --output bench.json
+    python -m benchmarks.run_suite --stages chunking sentiment --repeat 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 外部服务的凭据和缓存位置在导入业务模块之前设置好，导入时不会读取 Streamlit secrets
+os.environ.setdefault("GEMINI_API_KEY", "offline")
+os.environ.setdefault("TUSHARE_TOKEN", "offline")
+os.environ.setdefault("GEMINI_CACHE_DB", "")
+os.environ.setdefault("STOCK_CACHE_PATH", "")
+
+import numpy as np
+
+import tracing
+
+from benchmarks.synthetic import make_articles, make_offline_tokenizer, make_random_classifier
+
+STAGES = ("chunking", "sentiment", "model_forward", "monte_carlo", "plot", "stock_data", "gemini")
+
+
+def _timeit(fn, repeat, warmup=1):
+    """运行 fn 若干次，返回每次耗时（秒）的统计。"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.fmean(times), "runs": repeat}
+
+
+def _record(results, stage, params, timing, items=1, **extra):
+    entry = {"stage": stage, "params": params, "items": items, "seconds": timing,
+             "per_item_ms": timing["median"] / items * 1000, **extra}
+    results.append(entry)
+    print(f"{stage:<14} {json.dumps(params, ensure_ascii=False):<48} "
+          f"median {timing['median'] * 1000:>10.2f} ms  ({entry['per_item_ms']:.3f} ms/条)")
+
+
+def bench_chunking(args, results, tokenizer):
+    from model import split_text_into_chunks
+
+    for chars in args.chars:
+        articles = make_articles(args.n, num_chars=chars)
+        texts = [f"{title}。{content}" for title, content, _ in articles]
+        timing = _timeit(lambda: [split_text_into_chunks(t, tokenizer) for t in texts], args.repeat)
+        _record(results, "chunking", {"chars": chars}, timing, items=len(texts))
+
+
+def bench_sentiment(args, results):
+    from sentiment_analyzer import get_article_sentiment
+
+    for engine in ("jieba", "aho"):
+        for chars in args.chars:
+            articles = make_articles(args.n, num_chars=chars)
+            timing = _timeit(
+                lambda: [get_article_sentiment(title, content, engine=engine) for title, content, _ in articles],
+                args.repeat)
+            _record(results, "sentiment", {"engine": engine, "chars": chars}, timing, items=len(articles))
+
+
+def bench_model_forward(args, results, tokenizer):
+    import torch
+    from model import split_text_into_chunk_ids
+
+    model = make_random_classifier(num_hidden_layers=args.bert_layers)
+    max_chunks, max_length = 4, 512
+
+    def pad(chunk_ids, seq_len):
+        input_ids = torch.zeros((len(chunk_ids), seq_len), dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        for row, ids in enumerate(chunk_ids):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        return input_ids, attention_mask
+
+    for chars in args.chars:
+        articles = make_articles(args.model_batch, num_chars=chars)
+        chunk_lists = [split_text_into_chunk_ids(f"{t}。{c}", tokenizer, max_length, max_chunks)
+                       for t, c, _ in articles]
+        context = torch.tensor([[code, 0.0] for _, _, code in articles], dtype=torch.float32)
+
+        # 单篇：与 predict_by_model 相同，每块 padding 到 512、空块补齐到 4 块
+        first = chunk_lists[0] + [[] for _ in range(max_chunks - len(chunk_lists[0]))]
+        ids, mask = pad(first, max_length)
+
+        def single():
+            with torch.no_grad():
+                model(ids.unsqueeze(0), mask.unsqueeze(0), context[:1])
+
+        timing = _timeit(single, args.model_repeat)
+        _record(results, "model_forward", {"mode": "single_padded_512", "chars": chars,
+                                           "bert_layers": args.bert_layers}, timing,
+                chunks=len(chunk_lists[0]))
+
+        # 批量：所有非空块按批内最长长度动态 padding，一次编码，再一次分类
+        flat = [ids for chunks in chunk_lists for ids in chunks]
+        seq_len = max(len(ids) for ids in flat)
+        batch_ids, batch_mask = pad(flat, seq_len)
+
+        def batched():
+            with torch.no_grad():
+                cls = model.encode_chunks(batch_ids, batch_mask)
+                cls_seq = model.pad_cls(cls.device, cls.dtype).expand(len(articles), max_chunks, -1).clone()
+                row = 0
+                for i, chunks in enumerate(chunk_lists):
+                    cls_seq[i, :len(chunks)] = cls[row:row + len(chunks)]
+                    row += len(chunks)
+                model.classify(cls_seq, context)
+
+        timing = _timeit(batched, args.model_repeat)
+        _record(results, "model_forward", {"mode": "batched_dynamic", "chars": chars, "batch": len(articles),
+                                           "bert_layers": args.bert_layers}, timing,
+                items=len(articles), chunks=len(flat), seq_len=seq_len)
+
+
+def bench_monte_carlo(args, results, hist_df):
+    from plot_utils import run_monte_carlo_simulation
+
+    for sim_days, sims in ((90, 1000), (365, 1000), (365, 10000)):
+        timing = _timeit(lambda: run_monte_carlo_simulation(hist_df, sim_days=sim_days, num_simulations=sims, seed=0),
+                         args.repeat)
+        _record(results, "monte_carlo", {"sim_days": sim_days, "num_simulations": sims}, timing)
+
+
+def bench_plot(args, results, hist_df):
+    from plot_utils import plot_monte_carlo, run_monte_carlo_simulation
+
+    for sim_days in (90, 365):
+        sim_df, end_prices = run_monte_carlo_simulation(hist_df, sim_days=sim_days, num_simulations=1000, seed=0)
+        start_price = hist_df['close'].iloc[-1]
+        for mode in ("fan", "paths"):
+            payload = {}
+
+            def render():
+                fig, _ = plot_monte_carlo(sim_df, end_prices, start_price, mode=mode)
+                payload["json"] = fig.to_json()
+
+            timing = _timeit(render, args.repeat)
+            _record(results, "plot", {"mode": mode, "sim_days": sim_days}, timing,
+                    payload_bytes=len(payload["json"].encode("utf-8")))
+
+
+def bench_stock_data(args, results):
+    from stock_data import DailyBarCache, fetch_stock_data
+    from benchmarks.fakes import FakeTushareDaily
+
+    codes = [f"{600000 + i:06d}.SH" for i in range(args.stock_codes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTushareDaily(latency=args.stock_latency)
+        cache = DailyBarCache(path=os.path.join(tmp, "bars.sqlite"), fetch_fn=fake)
+        start = time.perf_counter()
+        for code in codes:
+            fetch_stock_data(code, "2024-06-10", 365, cache)
+        cold = time.perf_counter() - start
+        timing = _timeit(lambda: [fetch_stock_data(code, "2024-06-10", 365, cache) for code in codes], args.repeat,
+                         warmup=0)
+        _record(results, "stock_data", {"cache": "cold", "latency_s": args.stock_latency},
+                {"min": cold, "median": cold, "mean": cold, "runs": 1}, items=len(codes), fetch_calls=len(codes))
+        _record(results, "stock_data", {"cache": "warm", "latency_s": args.stock_latency}, timing,
+                items=len(codes), fetch_calls=len(fake.calls) - len(codes))
+
+
+def bench_gemini(args, results):
+    import predict_ai
+    from predict_ai import GeminiClient, gemini_prompt
+    from benchmarks.fakes import StubGeminiServer
+
+    prompts = [f"请分析第 {i} 条新闻。" * 20 for i in range(args.gemini_requests)]
+    with StubGeminiServer(delay=args.gemini_latency) as stub:
+        predict_ai._gemini_client = GeminiClient(url=stub.url)
+        timing = _timeit(lambda: [gemini_prompt(p, ttl=0) for p in prompts], args.repeat, warmup=0)
+        _record(results, "gemini", {"cache": "bypass", "latency_s": args.gemini_latency}, timing, items=len(prompts))
+
+        for p in prompts:
+            gemini_prompt(p)   # 写入响应缓存
+        timing = _timeit(lambda: [gemini_prompt(p) for p in prompts], args.repeat, warmup=0)
+        _record(results, "gemini", {"cache": "hit", "latency_s": args.gemini_latency}, timing, items=len(prompts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--chars", type=int, nargs="+", default=[300, 1000, 3000], help="合成正文长度")
+    parser.add_argument("--n", type=int, default=50, help="切块 / 情感环节的文章数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--bert-layers", type=int, default=12, help="随机模型的 BERT 层数（调小可快速冒烟）")
+    parser.add_argument("--model-batch", type=int, default=8)
+    parser.add_argument("--model-repeat", type=int, default=3)
+    parser.add_argument("--stock-codes", type=int, default=10)
+    parser.add_argument("--stock-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-requests", type=int, default=10)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--trace", action="store_true", help="开启 tracing，把各内部阶段的耗时直方图一并写入结果")
+    parser.add_argument("--output", help="结果 JSON 路径，默认输出到标准输出")
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable()
+
+    from benchmarks.bench_monte_carlo import make_history
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tokenizer = make_offline_tokenizer(tmp)
+        hist_df = make_history()
+        for stage in args.stages:
+            if stage == "chunking":
+                bench_chunking(args, results, tokenizer)
+            elif stage == "sentiment":
+                bench_sentiment(args, results)
+            elif stage == "model_forward":
+                bench_model_forward(args, results, tokenizer)
+            elif stage == "monte_carlo":
+                bench_monte_carlo(args, results, hist_df)
+            elif stage == "plot":
+                bench_plot(args, results, hist_df)
+            elif stage == "stock_data":
+                bench_stock_data(args, results)
+            elif stage == "gemini":
+                bench_gemini(args, results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "torch": sys.modules["torch"].__version__ if "torch" in sys.modules else None,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.trace:
+        report["stages"] = tracing.snapshot()
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"结果已写入 {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+合成中文财经新闻，用于基准测试（长度可控、可复现）。
+"""
+import os
+import random
+
+COMPANIES = ["平安银行", "贵州茅台", "宁德时代", "招商银行", "比亚迪", "中国石油", "万科A", "隆基绿能"]
+SUBJECTS = ["公司", "管理层", "董事会", "分析师", "监管部门", "市场人士", "机构投资者"]
+EVENTS = [
+    "发布了年度财报，净利润同比增长{pct}%",
+    "公告称拟回购不超过{num}亿元股份",
+    "高管团队发生变动，原财务总监辞职",
+    "表示行业景气度持续回升，订单饱满",
+    "披露研发投入大幅增加，新产品进展顺利",
+    "遭遇监管问询，业绩下滑引发市场担忧",
+    "宣布战略转型，加大海外市场布局",
+    "预计下一季度营收将下降{pct}%，亏损风险加大",
+]
+TAILS = ["。", "！", "？", "。"]
+
+
+def make_sentence(rng):
+    event = rng.choice(EVENTS).format(pct=rng.randint(1, 80), num=rng.randint(1, 50))
+    return f"{rng.choice(COMPANIES)}{rng.choice(SUBJECTS)}{event}{rng.choice(TAILS)}"
+
+
+def make_article(num_chars, rng):
+    """生成一篇正文约 num_chars 个字符的新闻，返回 (title, content)。"""
+    title = make_sentence(rng).rstrip("。！？")
+    sentences = []
+    length = 0
+    while length < num_chars:
+        sent = make_sentence(rng)
+        sentences.append(sent)
+        length += len(sent)
+    return title, "".join(sentences)
+
+
+def make_articles(n, num_chars=300, seed=0):
+    """生成 n 篇 (title, content, platform_code) 样本。"""
+    rng = random.Random(seed)
+    return [make_article(num_chars, rng) + (rng.randint(0, 2),) for _ in range(n)]
+
+
+# 与 hfl/chinese-roberta-wwm-ext 相同的词表大小
+BERT_VOCAB_SIZE = 21128
+
+
+def make_offline_tokenizer(directory):
+    """
+    用合成语料里出现的字符生成 vocab.txt 并构造 BertTokenizerFast，不访问 Hugging Face。
+    中文按字切分，与真实 tokenizer 的分词粒度一致，只是 id 不同。
+    """
+    from transformers import BertTokenizerFast
+
+    chars = set("".join(COMPANIES + SUBJECTS + EVENTS + TAILS))
+    chars |= set("0123456789abcdefghijklmnopqrstuvwxyz%，、：；（）“”")
+    chars -= set("{}")
+    path = os.path.join(directory, "vocab.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        # [PAD]=0, [UNK]=100, [CLS]=101, [SEP]=102, [MASK]=103，与真实词表一致
+        vocab = ["[PAD]"] + [f"[unused{i}]" for i in range(1, 100)] + ["[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+        f.write("\n".join(vocab + sorted(chars)) + "\n")
+    return BertTokenizerFast(vocab_file=path)
+
+
+def make_random_classifier(num_hidden_layers=12):
+    """
+    随机初始化的 DualInputFakeNewsClassifier（结构与线上模型相同，不下载权重），只用于计时。
+    """
+    import torch
+    from transformers import BertConfig
+    from model import DualInputFakeNewsClassifier
+
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=BERT_VOCAB_SIZE, num_hidden_layers=num_hidden_layers)
+    model = DualInputFakeNewsClassifier(bert_config=config)
+    # 构造时跳过了 BERT 的初始化（权重本应由 state_dict 覆盖），这里补做，避免未初始化内存里的非正规数拖慢计算
+    model.bert.apply(model.bert._init_weights)
+    return model.eval()
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# 各类本地缓存（模型权重、预测结果等）的默认根目录
+DEFAULT_CACHE_DIR = os.environ.get(
+    "FINANCIAL_NEWS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "financial-news")
+)
+
+
+def hash_key(*parts):
+    """把若干字段拼接后取 sha256，作为内容寻址的缓存键。"""
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """线程安全的进程内 LRU 缓存，支持条目数上限和过期时间（秒）。"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data), "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_sqlite_stores = weakref.WeakSet()
+
+
+def _reset_stores_after_fork():
+    # SQLite 连接不能跨 fork 使用；子进程里丢弃继承来的连接和锁，下次访问时重新打开
+    for store in list(_sqlite_stores):
+        store._lock = threading.Lock()
+        store._conn = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_stores_after_fork)
+
+
+class SQLiteStore:
+    """
+    基于 SQLite 的磁盘缓存，值用 pickle 序列化。
+    支持过期时间；条目数超过 max_entries 时按最近访问时间淘汰最旧的条目。
+    连接在每个进程首次访问时才打开（fork 出的子进程各自重新连接）。
+    """
+
+    _EVICT_EVERY = 64  # 每写入若干次检查一次容量，避免每次都 COUNT(*)
+
+    def __init__(self, path, max_entries=100_000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = None
+        self._pid = None
+        _sqlite_stores.add(self)
+
+    def _connection(self):
+        """当前进程的连接（调用方需持有 self._lock）。"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, key):
+        """返回 (value, expires_at)，未命中或已过期时返回 None；expires_at 为 None 表示永不过期。"""
+        now = time.time()
+        with self._lock:
+            self._connection()
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                return pickle.loads(row[0]), row[1]
+            if row is not None:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, blob, expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % self._EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class TwoTierCache:
+    """进程内 LRU + 可选的磁盘存储。磁盘命中后回填到内存层，并沿用该条目在磁盘上剩余的有效期。"""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            entry = self.disk.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                # 永不过期的条目按内存层的默认有效期回填
+                self.memory.set(key, value, None if expires_at is None else max(expires_at - time.time(), 1e-6))
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,254 @@
+"""
+假新闻判别模型的独立 HTTP 服务（不依赖 Streamlit），供其他服务调用。
+
+进程内只加载一次模型；并发到达的请求由 MicroBatcher 攒成小批次（批大小上限 / 最长等待时间），
+每个批次调用一次 predict_many，在一次前向计算中完成。
+
+接口：
+    POST /predict   {"title": ..., "content": ..., "platform_code": 0}
+                    或 {"articles": [{...}, ...]}
+    GET  /health    模型是否已加载、推理后端
+    GET  /metrics   队列深度、批次数、批大小与每批延迟分位数、预测缓存与块级 [CLS] 缓存命中情况、各阶段耗时直方图
+    GET  /metrics/prometheus   各阶段耗时直方图（Prometheus 文本格式，需开启 FINANCIAL_NEWS_TRACING=1）
+
+设置 --workers N 时，每个批次再平均分给 N 个共享模型权重的推理进程（见 worker_pool.py），
+此时 /metrics 中的缓存统计只反映父进程，各进程的缓存互相独立。
+
+用法（在项目根目录）：python inference_server.py --port 8000 --max-batch-size 32 --max-wait-ms 10 [--workers 4]
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tracing
+from predict_model import (INFERENCE_BACKEND, INFERENCE_BACKENDS, chunk_cache_stats, load_model, prediction_cache,
+                           predict_many)
+from worker_pool import InferenceWorkerPool
+
+
+class QueueFullError(Exception):
+    """等待队列已满，调用方应稍后重试。"""
+
+
+def _percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+class MicroBatcher:
+    """
+    把并发提交的单条请求攒成批次，交给 process_fn 一次处理。
+
+    后台线程取到第一条请求后，继续收集直到达到 max_batch_size 或等待超过 max_wait_ms，
+    然后调用 process_fn(items) -> results（与 items 一一对应），再分别完成各请求的 Future。
+
+    Args:
+        process_fn (callable): 批处理函数。
+        max_batch_size (int): 每批最多的请求数。
+        max_wait_ms (float): 第一条请求到达后最多等待多久再开始处理。
+        max_queue (int): 等待队列上限，超过时 submit 抛出 QueueFullError（背压）。
+    """
+
+    def __init__(self, process_fn, max_batch_size=32, max_wait_ms=10, max_queue=4096):
+        self.process_fn = process_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=2000)   # 每批处理耗时（秒）
+        self._sizes = deque(maxlen=2000)
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            raise QueueFullError("请求过多，队列已满")
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self.process_fn(items)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self.batches += 1
+                    self.items += len(batch)
+                    self._sizes.append(len(batch))
+                    self._latencies.append(time.perf_counter() - start)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            sizes = list(self._sizes)
+            batches, items, errors = self.batches, self.items, self.errors
+        return {
+            "queue_depth": self.queue_depth(),
+            "batches": batches, "items": items, "errors": errors,
+            "mean_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+            "batch_latency_ms": {
+                "p50": _percentile(latencies, 0.5) * 1000,
+                "p99": _percentile(latencies, 0.99) * 1000,
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            },
+        }
+
+
+def _parse_article(data):
+    """请求体中的一篇新闻 -> (title, content, platform_code)，字段缺失或类型错误时抛出 ValueError。"""
+    try:
+        title, content = data["title"], data["content"]
+        platform_code = int(data.get("platform_code", 1))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"无效的新闻字段: {e}")
+    if not isinstance(title, str) or not isinstance(content, str) or platform_code not in (0, 1, 2):
+        raise ValueError("title/content 必须是字符串，platform_code 必须是 0、1 或 2")
+    return title, content, platform_code
+
+
+class InferenceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256   # 默认 listen 队列只有 5，高并发建连时会丢 SYN、出现 1s 重传延迟
+
+
+def make_handler(batcher, backend, request_timeout=30.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True   # 头和正文分两次写出，避免与延迟 ACK 叠加出 40ms 等待
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False, default=float).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", "backend": backend, "queue_depth": batcher.queue_depth()})
+            elif self.path == "/metrics":
+                self._send_json(200, {"batcher": batcher.stats(), "prediction_cache": prediction_cache.stats(),
+                                      "chunk_cache": chunk_cache_stats(), "stages": tracing.snapshot()})
+            elif self.path == "/metrics/prometheus":
+                data = tracing.export_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                data = json.loads(self.rfile.read(length) or b"{}")
+                single = "articles" not in data
+                articles = [_parse_article(data)] if single else [_parse_article(a) for a in data["articles"]]
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            try:
+                futures = [batcher.submit(article) for article in articles]
+                results = [future.result(timeout=request_timeout) for future in futures]
+            except QueueFullError as e:
+                self._send_json(503, {"error": str(e)})
+                return
+            except Exception as e:
+                self._send_json(500, {"error": f"推理失败: {e}"})
+                return
+            self._send_json(200, results[0] if single else {"results": results})
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8000, max_batch_size=32, max_wait_ms=10, backend=None, max_chunks=4,
+          workers=0, threads_per_worker=None):
+    backend = backend or INFERENCE_BACKEND
+    print(f"加载模型（后端: {backend}）...")
+    pool = None
+    if workers > 0:
+        pool = InferenceWorkerPool(workers, threads_per_worker, backend=backend, max_chunks=max_chunks)
+        print(f"推理进程池: {pool.num_workers} 个进程 × {pool.threads_per_worker} 线程")
+    else:
+        load_model(backend)
+
+    def process(articles):
+        # 批内所有文本块一次送入 BERT、所有文章一次送入分类头
+        if pool is not None:
+            return pool.predict_many(articles, batch_size=len(articles) * max_chunks)
+        return predict_many(articles, batch_size=len(articles) * max_chunks, max_chunks=max_chunks, backend=backend)
+
+    batcher = MicroBatcher(process, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    server = InferenceHTTPServer((host, port), make_handler(batcher, backend))
+    print(f"推理服务已启动: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pool is not None:
+            pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="假新闻判别模型 HTTP 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--backend", choices=INFERENCE_BACKENDS, default=None)
+    parser.add_argument("--workers", type=int, default=0, help="推理进程数，0 表示在本进程推理")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="默认 CPU 核数 // 进程数")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_batch_size, args.max_wait_ms, args.backend,
+          workers=args.workers, threads_per_worker=args.threads_per_worker)
+
+
+if __name__ == "__main__":
+    main()
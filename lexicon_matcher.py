@@ -0,0 +1,121 @@
+"""
+基于 Aho-Corasick 自动机的词典匹配：一次线性扫描统计正负情感词命中数，不需要分词。
+
+安装了 pyahocorasick 时使用其 C 实现，否则退回纯 Python 实现，两者匹配语义相同：
+从左到右取最长匹配，匹配之间不重叠（近似分词后“整词命中”的效果）。
+"""
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:  # 可选依赖
+    ahocorasick = None
+
+POSITIVE = 1
+NEGATIVE = 2
+
+
+class _PyAutomaton:
+    """纯 Python 的 Aho-Corasick 自动机（goto / fail / output）。"""
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]   # 以该状态结尾的最长词：(flags, length)
+        for word, flags in words.items():
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                state = nxt
+            self._out[state] = (flags, len(word))
+        self._dict_suffix = [None] * len(self._goto)  # 沿 fail 链最近的输出状态
+        self._build()
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                fail_state = self._fail[nxt]
+                self._dict_suffix[nxt] = fail_state if self._out[fail_state] else self._dict_suffix[fail_state]
+
+    def iter_matches(self, text):
+        """产出所有（可重叠的）匹配：(end_index, flags, length)。"""
+        goto, fail, out, dict_suffix = self._goto, self._fail, self._out, self._dict_suffix
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            s = state if out[state] else dict_suffix[state]
+            while s:
+                flags, length = out[s]
+                yield i, flags, length
+                s = dict_suffix[s]
+
+    def iter_long(self, text):
+        """从左到右取最长、互不重叠的匹配。"""
+        best = {}   # start -> (length, flags)
+        for end, flags, length in self.iter_matches(text):
+            start = end - length + 1
+            if start not in best or best[start][0] < length:
+                best[start] = (length, flags)
+        next_free = 0
+        for start in sorted(best):
+            if start >= next_free:
+                length, flags = best[start]
+                yield start + length - 1, flags, length
+                next_free = start + length
+
+
+class LexiconMatcher:
+    """正负情感词表的一次扫描匹配器。"""
+
+    def __init__(self, positive_words, negative_words):
+        words = {}
+        for word in positive_words:
+            if word:
+                words[word] = words.get(word, 0) | POSITIVE
+        for word in negative_words:
+            if word:
+                words[word] = words.get(word, 0) | NEGATIVE
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for word, flags in words.items():
+                self._automaton.add_word(word, (flags, len(word)))
+            self._automaton.make_automaton()
+        else:
+            self._automaton = _PyAutomaton(words)
+
+    def _iter_long(self, text):
+        if ahocorasick is not None:
+            for end, (flags, length) in self._automaton.iter_long(text):
+                yield end, flags, length
+        else:
+            yield from self._automaton.iter_long(text)
+
+    def scan(self, text):
+        """
+        Returns:
+            tuple: (正面词命中数, 负面词命中数, 命中词覆盖的字符数)
+        """
+        pos_count = neg_count = covered = 0
+        if not text:
+            return pos_count, neg_count, covered
+        for _, flags, length in self._iter_long(text):
+            pos_count += bool(flags & POSITIVE)
+            neg_count += bool(flags & NEGATIVE)
+            covered += length
+        return pos_count, neg_count, covered
@@ -2,6 +2,9 @@ import torch
 import torch.nn as nn
 from transformers import BertModel
 import re
+from tracing import span, traced
+
+BERT_MODEL_NAME = "hfl/chinese-roberta-wwm-ext"
 
 # === 关键步骤 1: 复制训练时的 Attention 类 ===
 class Attention(nn.Module):
@@ -19,12 +22,19 @@ class Attention(nn.Module):
 # === 关键步骤 2: 复制训练时的模型定义，并稍作修改 ===
 class DualInputFakeNewsClassifier(nn.Module):
     # 修改__init__，不再需要 bert_model_path 参数，直接使用预设值
-    def __init__(self, context_input_dim=2, context_hidden_dim=16, final_hidden_dim=128, num_labels=2):
+    def __init__(self, context_input_dim=2, context_hidden_dim=16, final_hidden_dim=128, num_labels=2,
+                 bert_config=None):
         super().__init__()
 
-        # 直接加载预训练模型
-        self.bert = BertModel.from_pretrained("hfl/chinese-roberta-wwm-ext")
+        if bert_config is None:
+            # 直接加载预训练模型
+            self.bert = BertModel.from_pretrained(BERT_MODEL_NAME)
+        else:
+            # 只按配置搭结构；推理时在 meta 设备上构建（见 predict_model._build_model），
+            # 不分配参数内存，权重随后由微调后的 state_dict 整体接管
+            self.bert = BertModel(bert_config)
         self.bert_hidden_dim = self.bert.config.hidden_size
+        self._pad_cls_cache = {}
 
         # 使用和训练时完全一致的层定义
         self.bilstm = nn.LSTM(
@@ -52,26 +62,65 @@ class DualInputFakeNewsClassifier(nn.Module):
             nn.Linear(final_hidden_dim, num_labels)
         )
 
-    # forward 方法保持和训练时一致的逻辑
-    def forward(self, input_ids, attention_mask, context_features):
+    # 空块（全 0 padding）的 [CLS] 向量按 512 长度计算，与训练/原推理路径一致
+    pad_chunk_len = 512
+
+    def clear_pad_cache(self):
+        """权重变化（加载、量化）后清空空块 [CLS] 缓存。"""
+        self._pad_cls_cache = {}
+
+    def load_state_dict(self, state_dict, *args, **kwargs):
+        self.clear_pad_cache()
+        return super().load_state_dict(state_dict, *args, **kwargs)
+
+    def encode_chunks(self, input_ids, attention_mask):
         """
-        input_ids: [batch, num_chunks, 512]
-        attention_mask: [batch, num_chunks, 512]
-        context_features: [batch, 2]
+        把一批文本块一次性送入 BERT，返回每块的 [CLS] 向量。
+        input_ids / attention_mask: [N, seq_len]  ->  [N, 768]
         """
-        batch_size, num_chunks, _ = input_ids.size()
-        cls_list = []
+        bert_out = self.bert(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
+        return bert_out.last_hidden_state[:, 0, :]
 
-        for i in range(num_chunks):
-            input_ids_i = input_ids[:, i, :]           # [batch, 512]
-            attn_mask_i = attention_mask[:, i, :]      # [batch, 512]
+    def pad_cls(self, device, dtype):
+        """
+        全 0 输入、全 0 mask 的块经过 BERT 得到的 [CLS] 是一个只取决于权重的常量，
+        推理时只算一次并缓存，用它填回被跳过的空块，保证 logits 与逐块计算一致。
+        """
+        key = (device, dtype)
+        if key not in self._pad_cls_cache:
+            zeros = torch.zeros((1, self.pad_chunk_len), dtype=torch.long, device=device)
+            with torch.no_grad():
+                self._pad_cls_cache[key] = self.encode_chunks(zeros, zeros)[0].to(dtype)
+        return self._pad_cls_cache[key]
+
+    def embed_chunks(self, input_ids, attention_mask):
+        """
+        input_ids / attention_mask: [batch, num_chunks, seq_len]  ->  [batch, num_chunks, 768]
 
-            bert_out = self.bert(input_ids=input_ids_i, attention_mask=attn_mask_i, return_dict=True)
-            cls_i = bert_out.last_hidden_state[:, 0, :]   # 取 [CLS] 向量：[batch, 768]
-            cls_list.append(cls_i)
+        把所有块展平成一次 BERT 调用；推理模式下只编码非空块，
+        空块直接用缓存的 padding [CLS] 向量填回原位置。
+        """
+        batch_size, num_chunks, seq_len = input_ids.size()
+        flat_ids = input_ids.reshape(batch_size * num_chunks, seq_len)
+        flat_mask = attention_mask.reshape(batch_size * num_chunks, seq_len)
+
+        if self.training:
+            # 训练时保持原语义（dropout 下空块输出并非常量），仍合并为一次调用
+            cls_flat = self.encode_chunks(flat_ids, flat_mask)
+        else:
+            non_empty = flat_mask.sum(dim=1) > 0               # [batch*num_chunks]
+            encoded = self.encode_chunks(flat_ids[non_empty], flat_mask[non_empty])
+            pad_cls = self.pad_cls(encoded.device, encoded.dtype)
+            cls_flat = pad_cls.expand(batch_size * num_chunks, -1).clone()
+            cls_flat[non_empty] = encoded
 
-        cls_seq = torch.stack(cls_list, dim=1) # [batch, num_chunks, 768]
+        return cls_flat.reshape(batch_size, num_chunks, -1)
 
+    def classify(self, cls_seq, context_features):
+        """
+        cls_seq: [batch, num_chunks, 768]
+        context_features: [batch, 2]
+        """
         lstm_out, _ = self.bilstm(cls_seq)             # [batch, num_chunks, 512]
         news_vector = self.attention(lstm_out)         # [batch, 512]
 
@@ -82,32 +131,86 @@ class DualInputFakeNewsClassifier(nn.Module):
         logits = self.classifier(fusion)
         return logits
 
+    # forward 方法保持和训练时一致的逻辑
+    def forward(self, input_ids, attention_mask, context_features):
+        """
+        input_ids: [batch, num_chunks, 512]
+        attention_mask: [batch, num_chunks, 512]
+        context_features: [batch, 2]
+        """
+        cls_seq = self.embed_chunks(input_ids, attention_mask)  # [batch, num_chunks, 768]
+        return self.classify(cls_seq, context_features)
+
 
 # === 关键步骤 3: 复制文本切分函数 ===
+def _split_sentences(text):
+    sentences = re.split(r'(?<=[。！？!？])', text)
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def _plan_chunks(sentences, tokenizer, max_tokens, max_chunks):
+    """
+    每个句子只分词一次，按累计 token 数把句子分组。
+
+    句子都在句末标点处切开，BERT 分词在标点两侧天然断开，
+    所以 len(tokenize(a + b)) == len(tokenize(a)) + len(tokenize(b))，
+    分组边界与逐次拼接再分词的做法完全一致，但复杂度是线性的。
+
+    Returns:
+        (每句的 token id 列表, 每块对应的句子区间 [(start, end), ...])
+    """
+    with span("chunking.tokenize"):
+        sentence_ids = tokenizer(sentences, add_special_tokens=False)['input_ids']
+
+    groups = []
+    start, running = 0, 0
+    for i, ids in enumerate(sentence_ids):
+        # 检查添加新句子后是否会超长
+        if running + len(ids) > max_tokens - 2: # -2 for [CLS] and [SEP]
+            if i > start:
+                groups.append((start, i))
+            start, running = i, len(ids)
+        else:
+            running += len(ids)
+
+    if start < len(sentence_ids):
+        groups.append((start, len(sentence_ids)))
+
+    if len(groups) > max_chunks:
+        groups = groups[:2] + groups[-2:]
+    return sentence_ids, groups
+
+
+@traced("chunking.split_text")
 def split_text_into_chunks(text, tokenizer, max_tokens=512, max_chunks=4):
     if not isinstance(text, str):
         return []
 
-    sentences = re.split(r'(?<=[。！？!？])', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
+    sentences = _split_sentences(text)
+    if not sentences:
+        return []
 
-    all_chunks = []
-    current_chunk = ""
+    _, groups = _plan_chunks(sentences, tokenizer, max_tokens, max_chunks)
+    return ["".join(sentences[start:end]) for start, end in groups]
 
-    for sent in sentences:
-        # 检查添加新句子后是否会超长
-        temp_chunk = current_chunk + sent
-        if len(tokenizer.tokenize(temp_chunk)) > max_tokens - 2: # -2 for [CLS] and [SEP]
-            if current_chunk:
-                all_chunks.append(current_chunk)
-            current_chunk = sent
-        else:
-            current_chunk = temp_chunk
-    
-    if current_chunk:
-        all_chunks.append(current_chunk)
-
-    if len(all_chunks) > max_chunks:
-        return all_chunks[:2] + all_chunks[-2:]
-    else:
-        return all_chunks
+
+@traced("chunking.split_ids")
+def split_text_into_chunk_ids(text, tokenizer, max_tokens=512, max_chunks=4):
+    """
+    与 split_text_into_chunks 的切分边界相同，但直接返回每块编码后的 token id
+    （含 [CLS]/[SEP]，超长截断到 max_tokens），等价于对每块再调用一次
+    tokenizer(chunk, truncation=True, max_length=max_tokens)，省去二次分词。
+    """
+    if not isinstance(text, str):
+        return []
+
+    sentences = _split_sentences(text)
+    if not sentences:
+        return []
+
+    sentence_ids, groups = _plan_chunks(sentences, tokenizer, max_tokens, max_chunks)
+    chunk_ids = []
+    for start, end in groups:
+        ids = [token_id for sent_ids in sentence_ids[start:end] for token_id in sent_ids]
+        chunk_ids.append([tokenizer.cls_token_id] + ids[:max_tokens - 2] + [tokenizer.sep_token_id])
+    return chunk_ids
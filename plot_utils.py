@@ -1,8 +1,12 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import multiprocessing
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from tracing import traced
 
+@traced("plot.kline")
 def plot_stock_kline(df):
     # ... (这个函数保持不变，我们只是在它下面新增函数)
     if df is None or df.empty:
@@ -32,7 +36,53 @@ def plot_stock_kline(df):
 
 # --- 新增蒙特卡洛模拟与绘图功能 ---
 
-def run_monte_carlo_simulation(hist_df, sim_days=90, num_simulations=1000):
+def _estimate_gbm_params(hist_df):
+    """由历史收盘价估计几何布朗运动的漂移率(drift)和波动率(volatility)。"""
+    # 1. 计算历史日收益率
+    log_returns = np.log(1 + hist_df['close'].pct_change())
+
+    # 2. 计算漂移率(drift)和波动率(volatility)
+    mu = log_returns.mean()
+    var = log_returns.var()
+    drift = mu - 0.5 * var
+    stdev = log_returns.std()
+    return drift, stdev
+
+def simulate_price_paths(start_price, drift, stdev, sim_days, num_simulations,
+                         seed=None, dtype=np.float64, chunk_size=10_000):
+    """
+    向量化生成几何布朗运动价格路径，返回形状为 (sim_days, num_simulations) 的数组。
+
+    第 0 行为起始价格，第 t 行为起始价格乘以前 t 个日收益，与原逐日循环的语义一致。
+    按 chunk_size 条路径分块生成随机数并做累计对数收益，临时内存与路径总数无关。
+
+    Args:
+        seed (int | np.random.Generator): 随机种子或 Generator，用于复现结果。
+        dtype: np.float64 或 np.float32。
+        chunk_size (int): 每块的路径数。
+    """
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    dtype = np.dtype(dtype)
+    price_paths = np.empty((sim_days, num_simulations), dtype=dtype)
+    price_paths[0] = start_price
+    if sim_days < 2:
+        return price_paths
+
+    log_start = np.log(start_price)
+    for start in range(0, num_simulations, chunk_size):
+        end = min(start + chunk_size, num_simulations)
+        # 只需要 sim_days - 1 个日收益：第 0 天即起始价格
+        log_steps = rng.standard_normal((sim_days - 1, end - start), dtype=dtype)
+        log_steps *= dtype.type(stdev)
+        log_steps += dtype.type(drift)
+        np.cumsum(log_steps, axis=0, out=log_steps)
+        log_steps += dtype.type(log_start)
+        np.exp(log_steps, out=price_paths[1:, start:end])
+    return price_paths
+
+@traced("monte_carlo.simulate")
+def run_monte_carlo_simulation(hist_df, sim_days=90, num_simulations=1000,
+                               seed=None, dtype=np.float64, chunk_size=10_000):
     """
     基于历史数据，运行蒙特卡洛模拟。
     
@@ -40,57 +90,237 @@ def run_monte_carlo_simulation(hist_df, sim_days=90, num_simulations=1000):
         hist_df (pd.DataFrame): 包含'close'价格的历史数据DataFrame。
         sim_days (int): 模拟未来的天数。
         num_simulations (int): 模拟的次数。
+        seed (int): 随机种子，传入后结果可复现。
+        dtype: 路径数组的精度，np.float32 可减半内存。
+        chunk_size (int): 每次生成的路径数，控制临时内存。
         
     Returns:
         tuple: (模拟路径的DataFrame, 最终价格数组)
     """
-    # 1. 计算历史日收益率
-    log_returns = np.log(1 + hist_df['close'].pct_change())
-    
-    # 2. 计算漂移率(drift)和波动率(volatility)
-    mu = log_returns.mean()
-    var = log_returns.var()
-    drift = mu - 0.5 * var
-    stdev = log_returns.std()
-    
-    # 3. 生成随机变量 (几何布朗运动)
-    daily_returns = np.exp(drift + stdev * np.random.standard_normal((sim_days, num_simulations)))
-    
-    # 4. 生成价格路径
-    price_paths = np.zeros_like(daily_returns)
-    price_paths[0] = hist_df['close'].iloc[-1] # 起始价格为最近一天的收盘价
-    for t in range(1, sim_days):
-        price_paths[t] = price_paths[t-1] * daily_returns[t]
+    drift, stdev = _estimate_gbm_params(hist_df)
+    start_price = hist_df['close'].iloc[-1] # 起始价格为最近一天的收盘价
+
+    # 3./4. 生成随机变量并得到价格路径 (几何布朗运动)
+    price_paths = simulate_price_paths(start_price, drift, stdev, sim_days, num_simulations,
+                                       seed=seed, dtype=dtype, chunk_size=chunk_size)
         
     # 5. 整理数据格式
     # 创建未来日期索引
     last_date = hist_df['trade_date'].iloc[-1]
-    future_dates = pd.to_datetime([last_date + pd.DateOffset(days=i) for i in range(1, sim_days + 1)])
+    future_dates = pd.date_range(last_date + pd.DateOffset(days=1), periods=sim_days, freq='D')
     
-    sim_df = pd.DataFrame(price_paths, index=future_dates)
-    end_prices = sim_df.iloc[-1].values
+    sim_df = pd.DataFrame(price_paths, index=future_dates, copy=False)
+    end_prices = price_paths[-1]
     
     return sim_df, end_prices
 
-def plot_monte_carlo(sim_df, end_prices, start_price):
+class MonteCarloSummary:
+    """
+    流式蒙特卡洛模拟的汇总结果，不保存任何一条完整路径。
+
+    每天在对数价格轴上维护一个固定分箱的直方图（分箱范围按漂移和波动率预先确定，
+    超出范围的计入两端分箱），可以合并，也可以近似求任意分位数；
+    另外记录每天高于起始价格的路径数。
+
+    Attributes:
+        dates (pd.DatetimeIndex): 模拟日期。
+        counts (np.ndarray): [sim_days, num_bins] 每天各分箱的路径数。
+        above_start (np.ndarray): [sim_days] 每天高于起始价格的路径数。
+    """
+
+    def __init__(self, dates, start_price, log_low, bin_width, counts, above_start, num_simulations):
+        self.dates = dates
+        self.start_price = start_price
+        self.log_low = log_low
+        self.bin_width = bin_width
+        self.counts = counts
+        self.above_start = above_start
+        self.num_simulations = num_simulations
+
+    @property
+    def prob_higher(self):
+        """期末价格高于起始价格的概率。"""
+        return self.above_start[-1] / self.num_simulations
+
+    def quantiles(self, levels=(5, 25, 50, 75, 95)):
+        """返回 {百分位: 每日分位数价格数组}，分箱内线性插值。"""
+        sim_days = self.counts.shape[0]
+        rows = np.arange(sim_days)
+        cum = np.cumsum(self.counts, axis=1)
+        result = {}
+        for q in levels:
+            target = q / 100 * self.num_simulations
+            b = np.argmax(cum >= target, axis=1)
+            before = np.where(b > 0, cum[rows, np.maximum(b - 1, 0)], 0)
+            in_bin = self.counts[rows, b]
+            frac = np.where(in_bin > 0, (target - before) / np.maximum(in_bin, 1), 0.5)
+            prices = np.exp(self.log_low + (b + frac) * self.bin_width)
+            prices[0] = self.start_price   # 第 0 天所有路径都等于起始价格
+            result[q] = prices
+        return result
+
+    @property
+    def median_end_price(self):
+        return self.quantiles((50,))[50][-1]
+
+    def end_price_histogram(self, max_bars=100):
+        """期末价格分布：去掉两端的空分箱并合并相邻分箱，返回 (counts, 价格分箱边界)。"""
+        counts = self.counts[-1]
+        nonzero = np.nonzero(counts)[0]
+        first, last = nonzero[0], nonzero[-1] + 1
+        group = -(-(last - first) // max_bars)           # 向上取整
+        num_groups = -(-(last - first) // group)
+        padded = np.zeros(num_groups * group, dtype=counts.dtype)
+        padded[:last - first] = counts[first:last]
+        merged = padded.reshape(num_groups, group).sum(axis=1)
+        edges = np.exp(self.log_low[-1] + (first + np.arange(num_groups + 1) * group) * self.bin_width[-1])
+        return merged, edges
+
+def _streaming_block(task):
+    """生成一块路径并汇总为直方图计数；作为进程池任务时需要是模块级函数。"""
+    seed_seq, num_paths, start_price, drift, stdev, sim_days, log_low, bin_width, num_bins, dtype = task
+    paths = simulate_price_paths(start_price, drift, stdev, sim_days, num_paths,
+                                 seed=np.random.default_rng(seed_seq), dtype=dtype, chunk_size=num_paths)
+    above_start = (paths > start_price).sum(axis=1)
+
+    # 原地转成分箱下标，避免额外的整块临时数组
+    np.log(paths, out=paths)
+    paths -= log_low[:, None].astype(paths.dtype)
+    paths /= bin_width[:, None].astype(paths.dtype)
+    np.clip(paths, 0, num_bins - 1, out=paths)
+    idx = paths.astype(np.int32)
+    idx += (np.arange(sim_days, dtype=np.int32) * num_bins)[:, None]
+    counts = np.bincount(idx.ravel(), minlength=sim_days * num_bins).reshape(sim_days, num_bins)
+    return counts, above_start
+
+
+@traced("monte_carlo.streaming")
+def run_monte_carlo_streaming(hist_df, sim_days=90, num_simulations=1_000_000, block_size=10_000,
+                              seed=None, dtype=np.float32, num_bins=1024, width_sigmas=6.0, workers=1):
+    """
+    流式蒙特卡洛模拟：分块生成路径，只累计每日分位数直方图、期末价格分布和高于起始价的计数，
+    内存与模拟次数无关（100 万条路径也只需几十 MB）。
+
+    Args:
+        hist_df (pd.DataFrame): 包含'close'和'trade_date'的历史数据。
+        block_size (int): 每块的路径数，决定单个进程的峰值内存。
+        seed (int): 随机种子。每块使用由它派生的独立子种子，结果与 workers 数无关。
+        num_bins (int): 每日对数价格直方图的分箱数，决定分位数精度。
+        width_sigmas (float): 分箱范围为漂移中心 ± width_sigmas 倍的累计标准差。
+        workers (int): 进程数，>1 时各块分发到进程池并行计算。
+
+    Returns:
+        MonteCarloSummary
+    """
+    drift, stdev = _estimate_gbm_params(hist_df)
+    start_price = float(hist_df['close'].iloc[-1])
+
+    # 第 t 天的对数价格 ~ N(log S0 + t*drift, t*stdev^2)，按此确定每天的分箱范围
+    steps = np.arange(sim_days)
+    center = np.log(start_price) + drift * steps
+    half_width = width_sigmas * stdev * np.sqrt(np.maximum(steps, 1))
+    log_low = center - half_width
+    bin_width = 2 * half_width / num_bins
+
+    block_sizes = [min(block_size, num_simulations - start) for start in range(0, num_simulations, block_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(block_sizes))
+    tasks = [(s, n, start_price, drift, stdev, sim_days, log_low, bin_width, num_bins, dtype)
+             for s, n in zip(seeds, block_sizes)]
+
+    counts = np.zeros((sim_days, num_bins), dtype=np.int64)
+    above_start = np.zeros(sim_days, dtype=np.int64)
+    if workers > 1:
+        # 与推理进程池一致使用 forkserver：调用方可能是多线程的 Streamlit 进程，不能直接 fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver")) as pool:
+            results = pool.map(_streaming_block, tasks)
+            for block_counts, block_above in results:
+                counts += block_counts
+                above_start += block_above
+    else:
+        for task in tasks:
+            block_counts, block_above = _streaming_block(task)
+            counts += block_counts
+            above_start += block_above
+
+    last_date = hist_df['trade_date'].iloc[-1]
+    dates = pd.date_range(last_date + pd.DateOffset(days=1), periods=sim_days, freq='D')
+    return MonteCarloSummary(dates, start_price, log_low, bin_width, counts, above_start, num_simulations)
+
+def _add_fan_traces(fig, x, quantiles, row=1, col=1):
+    """
+    按分位数绘制扇形图：外层到内层成对填充区间，再画中位数线。
+
+    Args:
+        x: 横轴（日期）。
+        quantiles (dict): 百分位 -> 每日分位数数组，须包含 50。
     """
-    绘制蒙特卡洛模拟的“意大利面图”和最终价格分布直方图。
+    levels = sorted(p for p in quantiles if p != 50)
+    bands = list(zip(levels[:len(levels) // 2], reversed(levels[len(levels) // 2:])))
+    for i, (lo, hi) in enumerate(bands):
+        opacity = 0.15 + 0.15 * i
+        fig.add_trace(go.Scatter(x=x, y=quantiles[lo], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'),
+                      row=row, col=col)
+        fig.add_trace(go.Scatter(x=x, y=quantiles[hi], mode='lines', line=dict(width=0),
+                                 fill='tonexty', fillcolor=f'rgba(99, 110, 250, {opacity:.2f})',
+                                 name=f'{lo}%-{hi}% 区间'),
+                      row=row, col=col)
+
+    fig.add_trace(go.Scatter(x=x, y=quantiles[50], mode='lines',
+                             line=dict(color='blue', width=3), name='中位数路径'),
+                  row=row, col=col)
+
+@traced("plot.monte_carlo")
+def plot_monte_carlo(sim_df, end_prices, start_price, mode="fan",
+                     percentiles=(5, 25, 50, 75, 95), sample_paths=20, seed=0):
+    """
+    绘制蒙特卡洛模拟路径图和最终价格分布直方图。
+
+    Args:
+        mode (str): "fan" 绘制分位数扇形图（少量 trace，体积小）；
+            "paths" 为原来的“意大利面图”，每条路径一个 trace。
+        percentiles (tuple): 扇形图使用的百分位，须包含 50。
+        sample_paths (int): 扇形图上叠加的随机样本路径数，合并为一个 trace，0 表示不叠加。
+        seed (int): 抽取样本路径的随机种子。
     """
     # 创建带两个Y轴的子图，左边是路径图，右边是直方图
     fig = make_subplots(rows=1, cols=2, column_widths=[0.8, 0.2], shared_yaxes=True,
                         subplot_titles=('未来股价模拟路径', '最终价格分布'))
+    num_simulations = sim_df.shape[1]
+
+    if mode == "paths":
+        # 1. 绘制所有模拟路径（意大利面）
+        for col in sim_df.columns:
+            fig.add_trace(go.Scatter(x=sim_df.index, y=sim_df[col], mode='lines', 
+                                     line=dict(color='grey', width=0.5), showlegend=False), 
+                          row=1, col=1)
 
-    # 1. 绘制所有模拟路径（意大利面）
-    for col in sim_df.columns:
-        fig.add_trace(go.Scatter(x=sim_df.index, y=sim_df[col], mode='lines', 
-                                 line=dict(color='grey', width=0.5), showlegend=False), 
-                      row=1, col=1)
+        # 2. 绘制中位数路径 (加粗蓝线)
+        median_path = sim_df.median(axis=1)
+        fig.add_trace(go.Scatter(x=sim_df.index, y=median_path, mode='lines',
+                                     line=dict(color='blue', width=3), name='中位数路径'),
+                          row=1, col=1)
+    elif mode == "fan":
+        values = sim_df.to_numpy()
+        # 1. 少量样本路径合并成一个 trace，路径之间用 None 断开
+        if sample_paths:
+            rng = np.random.default_rng(seed)
+            picked = rng.choice(num_simulations, size=min(sample_paths, num_simulations), replace=False)
+            x = list(sim_df.index) + [None]
+            xs, ys = [], []
+            for j in picked:
+                xs.extend(x)
+                ys.extend(values[:, j].tolist() + [None])
+            fig.add_trace(go.Scatter(x=xs, y=ys, mode='lines', line=dict(color='grey', width=0.5),
+                                     name='样本路径', connectgaps=False),
+                          row=1, col=1)
 
-    # 2. 绘制中位数路径 (加粗蓝线)
-    median_path = sim_df.median(axis=1)
-    fig.add_trace(go.Scatter(x=sim_df.index, y=median_path, mode='lines',
-                                 line=dict(color='blue', width=3), name='中位数路径'),
-                      row=1, col=1)
+        # 2. 分位数区间 + 中位数路径
+        levels = sorted(set(percentiles) | {50})
+        bands = np.percentile(values, levels, axis=1)
+        _add_fan_traces(fig, sim_df.index, dict(zip(levels, bands)), row=1, col=1)
+    else:
+        raise ValueError(f"未知的绘图模式: {mode}，可选: fan, paths")
 
     # 3. 绘制最终价格分布直方图 (在右边子图)
     fig.add_trace(go.Histogram(y=end_prices, name='价格分布', marker_color='#636EFA'), 
@@ -99,7 +329,7 @@ def plot_monte_carlo(sim_df, end_prices, start_price):
     # 4. 美化布局
     sim_days = len(sim_df)
     fig.update_layout(
-        title_text=f'未来 {sim_days} 天股价蒙特卡洛模拟 (1000次)',
+        title_text=f'未来 {sim_days} 天股价蒙特卡洛模拟 ({num_simulations}次)',
         yaxis_title='股价',
         xaxis_title='日期'
     )
@@ -108,3 +338,24 @@ def plot_monte_carlo(sim_df, end_prices, start_price):
     prob_higher = np.mean(end_prices > start_price)
     
     return fig, prob_higher
+
+@traced("plot.monte_carlo_summary")
+def plot_monte_carlo_summary(summary, percentiles=(5, 25, 50, 75, 95)):
+    """由 MonteCarloSummary 绘制扇形图和期末价格分布，返回 (fig, prob_higher)。"""
+    fig = make_subplots(rows=1, cols=2, column_widths=[0.8, 0.2], shared_yaxes=True,
+                        subplot_titles=('未来股价模拟路径', '最终价格分布'))
+
+    levels = sorted(set(percentiles) | {50})
+    _add_fan_traces(fig, summary.dates, summary.quantiles(levels), row=1, col=1)
+
+    counts, edges = summary.end_price_histogram()
+    fig.add_trace(go.Bar(x=counts, y=(edges[:-1] + edges[1:]) / 2, orientation='h',
+                         name='价格分布', marker_color='#636EFA'),
+                  row=1, col=2)
+
+    fig.update_layout(
+        title_text=f'未来 {len(summary.dates)} 天股价蒙特卡洛模拟 ({summary.num_simulations}次)',
+        yaxis_title='股价',
+        xaxis_title='日期'
+    )
+    return fig, summary.prob_higher
@@ -1,20 +1,365 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import streamlit as st
-from datetime import date
+from datetime import date, datetime
+import tracing
+from cache_utils import DEFAULT_CACHE_DIR, LRUCache, SQLiteStore, TwoTierCache, hash_key
+from plot_utils import plot_stock_kline, run_monte_carlo_simulation, plot_monte_carlo
 
-GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY") or st.secrets["GEMINI_API_KEY"]
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+# 可指向本地桩服务器做测试
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+# API key 放在 x-goog-api-key 请求头里，不拼进 URL（请求异常信息会带上 URL）
+GEMINI_URL = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent"
+
+# 连接/读取超时（秒）、最大重试次数、同时进行的请求上限
+GEMINI_CONNECT_TIMEOUT = float(os.environ.get("GEMINI_CONNECT_TIMEOUT", "5"))
+GEMINI_READ_TIMEOUT = float(os.environ.get("GEMINI_READ_TIMEOUT", "60"))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "3"))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+# 同时进行的流式生成上限：流式请求在整段生成期间占用名额，与普通请求分开计数，
+# 长时间的流式生成不会让判别、时效性判断等普通请求排队
+GEMINI_MAX_STREAMS = int(os.environ.get("GEMINI_MAX_STREAMS", "8"))
+
+# Gemini 响应缓存：进程内 LRU + SQLite（GEMINI_CACHE_DB 设为空字符串时只用内存）
+GEMINI_CACHE_SIZE = int(os.environ.get("GEMINI_CACHE_SIZE", "512"))
+GEMINI_CACHE_MAX_ENTRIES = int(os.environ.get("GEMINI_CACHE_MAX_ENTRIES", "20000"))
+GEMINI_CACHE_DB = os.environ.get("GEMINI_CACHE_DB", os.path.join(DEFAULT_CACHE_DIR, "gemini_cache.sqlite"))
+# 各类调用的缓存有效期（秒）：时效性判断依赖当天日期，有效期短；分析类回答有效期长
+GEMINI_TTL_TIMELINESS = float(os.environ.get("GEMINI_TTL_TIMELINESS", str(3600)))
+GEMINI_TTL_ADVICE = float(os.environ.get("GEMINI_TTL_ADVICE", str(24 * 3600)))
+GEMINI_TTL_VERIFY = float(os.environ.get("GEMINI_TTL_VERIFY", str(7 * 24 * 3600)))
+
+# 投资分析各步骤（时效性判断、行情拉取、建议生成、蒙特卡洛）共用的线程池大小
+ANALYSIS_MAX_WORKERS = int(os.environ.get("ANALYSIS_MAX_WORKERS", "8"))
+# 流式生成（投资建议、模拟解读）的后台线程数：与上面的线程池分开，长时间的流式生成不会占满短阶段的线程；
+# 默认等于流式并发上限，多出的线程只会在客户端的名额上空等
+ANALYSIS_STREAM_WORKERS = int(os.environ.get("ANALYSIS_STREAM_WORKERS", str(GEMINI_MAX_STREAMS)))
+# 分析阶段结果的记忆条目数和有效期（秒）
+ANALYSIS_MEMO_SIZE = int(os.environ.get("ANALYSIS_MEMO_SIZE", "256"))
+ANALYSIS_MEMO_TTL = float(os.environ.get("ANALYSIS_MEMO_TTL", str(3600)))
+
+
+class GeminiError(Exception):
+    """Gemini 请求失败（超时、重试耗尽或响应格式异常）。"""
+
+
+class StaleNewsError(Exception):
+    """新闻时效性较低，依赖时效性判断的后续阶段不再执行。"""
+
+
+# Gemini 失败时展示给用户的提示文字
+GEMINI_ERROR_TEXT = "❌ Gemini响应异常"
+
+
+def _stream_url(url):
+    """generateContent 地址 -> streamGenerateContent?alt=sse 地址（保留原有查询参数）。"""
+    base, _, query = url.partition("?")
+    base = base.replace(":generateContent", ":streamGenerateContent")
+    return f"{base}?{query}&alt=sse" if query else f"{base}?alt=sse"
+
+
+def _percentile_ms(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)] * 1000 if values else 0.0
+
+
+class GeminiClient:
+    """
+    Gemini REST 客户端：复用连接池（keep-alive）、设置连接/读取超时、
+    对 429/5xx 和网络错误做有上限的指数退避重试，并限制并发请求数、记录每次调用的延迟。
+    普通请求和流式请求各有独立的并发上限（max_concurrency / max_streams）。
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, url=GEMINI_URL, connect_timeout=GEMINI_CONNECT_TIMEOUT, read_timeout=GEMINI_READ_TIMEOUT,
+                 max_retries=GEMINI_MAX_RETRIES, backoff=1.0, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 api_key=GEMINI_API_KEY, max_streams=GEMINI_MAX_STREAMS):
+        self.url = url
+        self.stream_url = _stream_url(url)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency + max_streams)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "x-goog-api-key": api_key})
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._stream_semaphore = threading.BoundedSemaphore(max_streams)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._ttfts = deque(maxlen=1000)   # 流式调用的首个片段到达时间
+        self._queue_waits = deque(maxlen=1000)   # 等待并发名额的时间，不计入上面的延迟
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = self.backoff * (2 ** attempt) * (1 + random.random())
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        with self._lock:
+            self.retries += 1
+        time.sleep(delay)
+
+    def _post(self, url, message, stream=False):
+        """发送请求直到拿到 200 响应；可重试的失败按指数退避重试，其余失败抛出 GeminiError。"""
+        payload = {"contents": [{"parts": [{"text": message}]}]}
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    raise GeminiError(f"Gemini 请求失败: {type(e).__name__}") from e
+                self._sleep_before_retry(attempt)
+                continue
+            except requests.RequestException as e:
+                raise GeminiError(f"Gemini 请求失败: {type(e).__name__}") from e
+
+            if response.status_code in self.RETRY_STATUS and not last:
+                response.close()
+                self._sleep_before_retry(attempt, response)
+                continue
+            if response.status_code != 200:
+                raise GeminiError(f"Gemini 返回 HTTP {response.status_code}: {response.text[:200]}")
+            return response
+
+    def _record(self, start, failed, ttft=None, name="gemini.request", queue_wait=0.0):
+        if tracing.is_enabled():
+            tracing.observe(name, time.perf_counter() - start, failed)
+            tracing.observe("gemini.queue_wait", queue_wait)
+            if ttft is not None:
+                tracing.observe("gemini.stream_ttft", ttft)
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self._latencies.append(time.perf_counter() - start)
+            self._queue_waits.append(queue_wait)
+            if ttft is not None:
+                self._ttfts.append(ttft)
+
+    def generate(self, message):
+        """发送一次 generateContent 请求并返回文本，失败时抛出 GeminiError。"""
+        queued = time.perf_counter()
+        with self._semaphore:
+            # 延迟从拿到并发名额时开始计，等待名额的时间单独记为 queue_wait
+            start = time.perf_counter()
+            failed = True
+            try:
+                response = self._post(self.url, message)
+                try:
+                    text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+                except (ValueError, KeyError, IndexError) as e:
+                    raise GeminiError(f"Gemini 响应格式异常: {response.text[:200]}") from e
+                failed = False
+                return text
+            finally:
+                self._record(start, failed, queue_wait=start - queued)
+
+    def stream_generate(self, message):
+        """
+        调用 streamGenerateContent（SSE），逐个产出文本片段，失败时抛出 GeminiError。
+        只在收到响应之前重试；读超时作用于相邻两个片段之间的等待。
+        """
+        queued = time.perf_counter()
+        with self._stream_semaphore:
+            start = time.perf_counter()
+            ttft = None
+            failed = True
+            try:
+                response = self._post(self.stream_url, message, stream=True)
+                # SSE 规定为 UTF-8；text/event-stream 不带 charset 时 requests 会按 ISO-8859-1 解码
+                response.encoding = "utf-8"
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        try:
+                            event = json.loads(line[len("data:"):])
+                            parts = event["candidates"][0]["content"]["parts"]
+                        except (ValueError, KeyError, IndexError) as e:
+                            raise GeminiError(f"Gemini 流式响应格式异常: {line[:200]}") from e
+                        delta = "".join(part.get("text", "") for part in parts)
+                        if delta:
+                            if ttft is None:
+                                ttft = time.perf_counter() - start
+                            yield delta
+                except requests.RequestException as e:
+                    raise GeminiError(f"Gemini 流式响应中断: {type(e).__name__}") from e
+                except GeneratorExit:
+                    failed = False   # 调用方提前停止读取，不算失败
+                    raise
+                finally:
+                    response.close()
+                failed = False
+            finally:
+                self._record(start, failed, ttft, name="gemini.stream", queue_wait=start - queued)
+
+    def metrics(self):
+        """调用次数、错误/重试次数、最近调用的延迟分位数、流式首片段延迟和等待并发名额的时间（毫秒）。"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            ttfts = sorted(self._ttfts)
+            queue_waits = sorted(self._queue_waits)
+            calls, errors, retries = self.calls, self.errors, self.retries
+
+        return {
+            "calls": calls, "errors": errors, "retries": retries,
+            "p50_ms": _percentile_ms(latencies, 0.5), "p95_ms": _percentile_ms(latencies, 0.95),
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "ttft_p50_ms": _percentile_ms(ttfts, 0.5), "ttft_p95_ms": _percentile_ms(ttfts, 0.95),
+            "queue_p50_ms": _percentile_ms(queue_waits, 0.5), "queue_p95_ms": _percentile_ms(queue_waits, 0.95),
+        }
+
+
+_gemini_client = None
+_gemini_client_lock = threading.Lock()
+
+def get_gemini_client():
+    """进程内共享的 GeminiClient（共享连接池和并发上限）。"""
+    global _gemini_client
+    with _gemini_client_lock:
+        if _gemini_client is None:
+            _gemini_client = GeminiClient()
+        return _gemini_client
+
+_gemini_cache = None
+_gemini_cache_lock = threading.Lock()
+
+def get_gemini_cache():
+    """进程内共享的 Gemini 响应缓存，首次使用时才创建 SQLite 文件。"""
+    global _gemini_cache
+    with _gemini_cache_lock:
+        if _gemini_cache is None:
+            _gemini_cache = TwoTierCache(
+                LRUCache(maxsize=GEMINI_CACHE_SIZE),
+                SQLiteStore(GEMINI_CACHE_DB, max_entries=GEMINI_CACHE_MAX_ENTRIES) if GEMINI_CACHE_DB else None,
+            )
+        return _gemini_cache
+
+def gemini_cache_stats():
+    """Gemini 响应缓存命中情况和客户端延迟指标。"""
+    return {"cache": get_gemini_cache().stats(), "client": get_gemini_client().metrics()}
+
+@tracing.traced("gemini.prompt")
+def gemini_prompt(message: str, ttl=GEMINI_TTL_ADVICE, raise_errors=False):
+    """
+    调用 Gemini 并返回文本。相同模型 + 相同提示词在 ttl 秒内直接返回缓存结果，
+    ttl 为 0 时不走缓存；失败的响应不会被缓存。
+    失败时默认返回提示文字，raise_errors=True 时抛出 GeminiError（供需要区分失败的调用方使用）。
+    """
+    cache = get_gemini_cache() if ttl else None
+    key = hash_key(GEMINI_MODEL, message)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
 
-def gemini_prompt(message: str):
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": message}]}]
-    }
-    response = requests.post(GEMINI_URL, json=payload, headers=headers)
     try:
-        return response.json()["candidates"][0]["content"]["parts"][0]["text"]
-    except:
-        return "❌ Gemini响应异常"
+        text = get_gemini_client().generate(message)
+    except GeminiError as e:
+        if raise_errors:
+            raise
+        print(f"Gemini 调用失败: {e}")
+        return GEMINI_ERROR_TEXT
+
+    if cache is not None:
+        cache.set(key, text, ttl=ttl)
+    return text
+
+def gemini_prompt_stream(message: str, ttl=GEMINI_TTL_ADVICE):
+    """
+    gemini_prompt 的流式版本：生成器，逐个产出文本片段，便于界面边生成边显示。
+    缓存命中时一次性产出完整文本；只有完整接收的回答才写入缓存。
+    失败时抛出 GeminiError（已产出的片段不写入缓存），由 TextStream 转成提示文字并标记为失败。
+    """
+    cache = get_gemini_cache() if ttl else None
+    key = hash_key(GEMINI_MODEL, message)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    deltas = []
+    for delta in get_gemini_client().stream_generate(message):
+        deltas.append(delta)
+        yield delta
+
+    if cache is not None and deltas:
+        cache.set(key, "".join(deltas), ttl=ttl)
+
+
+class TextStream:
+    """
+    由后台线程写入、可以多次从头迭代的文本流：迭代时先回放已收到的片段，再等待后续片段。
+    用于让分析阶段在线程池里流式生成，界面在每次重跑时都能用 st.write_stream 渲染。
+    生成过程中出错（Gemini 失败或其他异常）时在末尾追加提示文字，并把 failed 置为 True（阶段记忆据此丢弃这条结果）。
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._done = False
+        self.failed = False
+        self._cond = threading.Condition()
+
+    def _append(self, delta):
+        with self._cond:
+            self._chunks.append(delta)
+            self._cond.notify_all()
+
+    def produce(self, deltas):
+        """在后台线程中消费 deltas 生成器，把片段追加到流中。"""
+        try:
+            for delta in deltas:
+                self._append(delta)
+        except Exception as e:
+            # 不只是 GeminiError：任何中途抛出的异常（如提示词缓存的 sqlite 错误）都说明文本不完整
+            print(f"Gemini 流式调用失败: {type(e).__name__}: {e}")
+            self.failed = True
+            self._append(f"\n\n{GEMINI_ERROR_TEXT}" if self._chunks else GEMINI_ERROR_TEXT)
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    @property
+    def done(self):
+        return self._done
+
+    def snapshot(self):
+        """不阻塞地返回 (目前已收到的文本, 是否已结束)。"""
+        with self._cond:
+            return "".join(self._chunks), self._done
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: index < len(self._chunks) or self._done)
+                batch = self._chunks[index:]
+                if not batch:
+                    return
+                index += len(batch)
+            yield from batch
+
+    def text(self):
+        """等待生成结束并返回完整文本。"""
+        return "".join(self)
 
 def predict_by_ai(title, content, platform_code, news_date_str):
     today_str = date.today().strftime('%Y-%m-%d')
@@ -35,13 +380,57 @@ def predict_by_ai(title, content, platform_code, news_date_str):
 
     """
     # 使用 refined prompt
-    return gemini_prompt(prompt_refined)
+    return gemini_prompt(prompt_refined, ttl=GEMINI_TTL_VERIFY)
+
+# 时效性快速判断：短期事件类新闻 7 天内有效，长期趋势类新闻 30 天内有效
+TIMELINESS_EVENT_DAYS = 7
+TIMELINESS_TREND_DAYS = 30
+TIMELINESS_EVENT_KEYWORDS = ("财报", "年报", "季报", "业绩", "公告", "高管", "辞职", "任命", "停牌", "复牌",
+                             "分红", "回购", "增持", "减持", "并购", "重组", "突发")
+TIMELINESS_TREND_KEYWORDS = ("行业", "战略", "研发", "规划", "布局", "转型", "趋势", "技术", "产能", "政策")
+
+# 各判断路径的计数，用于统计本地规则省掉了多少次 Gemini 调用
+timeliness_stats = {"date_rule": 0, "keyword_rule": 0, "gemini": 0}
+_timeliness_stats_lock = threading.Lock()
+
+def classify_timeliness(news_date, title="", content="", today=None):
+    """
+    本地规则判断新闻时效性，不调用 Gemini。
 
-def check_timeliness(news_date, stock_code):
+    Returns:
+        tuple: (结论, 判断路径)。结论为 True（具有参考价值）、False（时效性较低）
+               或 None（规则无法确定，需要交给 Gemini）；判断路径为 "date_rule" / "keyword_rule" / "gemini"。
+    """
+    today = today or date.today()
+    delta = (today - datetime.strptime(news_date, '%Y-%m-%d').date()).days
+    if delta <= TIMELINESS_EVENT_DAYS:
+        return True, "date_rule"      # 两类新闻都还在有效期内
+    if delta > TIMELINESS_TREND_DAYS:
+        return False, "date_rule"     # 两类新闻都已过期
+
+    # 7~30 天之间取决于新闻类型：看标题和正文里命中的事件类/趋势类关键词数
+    text = f"{title} {content}"
+    event_hits = sum(keyword in text for keyword in TIMELINESS_EVENT_KEYWORDS)
+    trend_hits = sum(keyword in text for keyword in TIMELINESS_TREND_KEYWORDS)
+    if event_hits > trend_hits:
+        return False, "keyword_rule"
+    if trend_hits > event_hits:
+        return True, "keyword_rule"
+    return None, "gemini"
+
+def check_timeliness(news_date, stock_code, title="", content="", raise_errors=False):
     """
     检查新闻时效性。
-    通过设定明确的规则和输出格式，引导AI做出更符合预期的判断。
+    日期差和关键词能确定的情况在本地判断；只有规则无法区分新闻类型时才调用 Gemini，并把新闻内容一起发过去。
+    Gemini 失败时默认视为有效；raise_errors=True 时抛出 GeminiError。
     """
+    verdict, path = classify_timeliness(news_date, title, content)
+    with _timeliness_stats_lock:
+        timeliness_stats[path] += 1
+    if verdict is not None:
+        print(f"时效性判断 [{path}]: {news_date} {stock_code} -> {'[A]' if verdict else '[B]'}")
+        return verdict
+
     today_str = date.today().strftime('%Y-%m-%d')
     
     prompt = f"""
@@ -55,6 +444,8 @@ def check_timeliness(news_date, stock_code):
     **任务：**
     新闻发布日期：{news_date}
     涉及股票：{stock_code}
+    新闻标题：{title}
+    新闻正文：{content[:1000]}
 
     请分析以上信息，并从以下两个选项中选择一个作为你的回答，不要添加任何额外的解释或文字。
 
@@ -65,10 +456,10 @@ def check_timeliness(news_date, stock_code):
     请直接返回你的选择，例如：[A]
     """
     
-    response = gemini_prompt(prompt)
+    response = gemini_prompt(prompt, ttl=GEMINI_TTL_TIMELINESS, raise_errors=raise_errors)
     
     # 打印AI的原始回复，方便调试
-    print(f"Gemini 时效性判断原始回复: {response}")
+    print(f"时效性判断 [gemini] 原始回复: {response}")
     
     # 检查回复中是否包含 "[A]" 或 "参考价值"
     # 只要不明确说 "时效性较低" 或 "[B]"，我们都默认为有效
@@ -77,9 +468,10 @@ def check_timeliness(news_date, stock_code):
     else:
         return True
 
-def generate_investment_advice(news, stock_data_short_str, stock_data_long_str):
+def generate_investment_advice(news, stock_data_short_str, stock_data_long_str, stream=False):
     """
     根据新闻、短期（7天）和长期（30天）的股票数据生成投资建议。
+    stream=True 时返回逐段产出文本的生成器。
     """
     prompt = f"""
     你是一位资深的金融市场分析师。请基于以下新闻事件、短期（过去7个交易日）和长期（过去30个交易日）的股票数据，提供一份专业的投资建议。
@@ -113,11 +505,12 @@ def generate_investment_advice(news, stock_data_short_str, stock_data_long_str):
     **风险提示**：[在此处提示潜在的风险]。
     ---
     """
-    return gemini_prompt(prompt)
+    return gemini_prompt_stream(prompt) if stream else gemini_prompt(prompt)
 
-def generate_monte_carlo_advice(stock_code, sim_days, prob_higher, final_price_median):
+def generate_monte_carlo_advice(stock_code, sim_days, prob_higher, final_price_median, stream=False):
     """
     根据蒙特卡洛模拟的结果，生成一段总结性建议。
+    stream=True 时返回逐段产出文本的生成器。
     """
     prob_percent = f"{prob_higher:.1%}"
     
@@ -138,4 +531,191 @@ def generate_monte_carlo_advice(stock_code, sim_days, prob_higher, final_price_m
 
     **请直接返回你生成的解读文字。**
     """
-    return gemini_prompt(prompt)
+    return gemini_prompt_stream(prompt) if stream else gemini_prompt(prompt)
+
+
+# ---------------- 并发编排 ----------------
+# 互不依赖的步骤并发执行，返回 Future，由界面按完成顺序渲染。
+
+_analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis")
+_stream_executor = ThreadPoolExecutor(max_workers=ANALYSIS_STREAM_WORKERS, thread_name_prefix="analysis-stream")
+_stage_memo = LRUCache(maxsize=ANALYSIS_MEMO_SIZE, ttl=ANALYSIS_MEMO_TTL)
+_stage_lock = threading.RLock()
+
+def _then(parents, fn):
+    """
+    parents 全部完成后把 fn(*结果) 提交到线程池，返回代表其结果的 Future。
+    任一上游失败（或被取消）时异常直接传递下去；等待上游期间不占用工作线程。
+    """
+    result = Future()
+    remaining = [len(parents)]
+    lock = threading.Lock()
+
+    def copy_outcome(inner):
+        if inner.exception() is not None:
+            result.set_exception(inner.exception())
+        else:
+            result.set_result(inner.result())
+
+    def on_parent_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        if not result.set_running_or_notify_cancel():
+            return
+        try:
+            args = [parent.result() for parent in parents]
+        except BaseException as e:
+            result.set_exception(e)
+            return
+        _analysis_executor.submit(fn, *args).add_done_callback(copy_outcome)
+
+    for parent in parents:
+        parent.add_done_callback(on_parent_done)
+    return result
+
+def _after(gate, start):
+    """
+    gate 成功后才调用 start() 创建（或复用）阶段 Future，返回跟随其结果的 Future；gate 失败时直接传递异常。
+    被记忆的阶段本身不依赖 gate，其他会话复用时不会受这条新闻的时效性影响。
+    """
+    result = Future()
+
+    def copy_outcome(inner):
+        if inner.exception() is not None:
+            result.set_exception(inner.exception())
+        else:
+            result.set_result(inner.result())
+
+    def on_gate_done(_):
+        if gate.exception() is not None:
+            result.set_exception(gate.exception())
+            return
+        try:
+            start().add_done_callback(copy_outcome)
+        except BaseException as e:
+            result.set_exception(e)
+
+    gate.add_done_callback(on_gate_done)
+    return result
+
+def _timely_gate(timely):
+    """时效性判断完成后放行：结论为 False 时以 StaleNewsError 结束；Gemini 失败按有效处理。"""
+    gate = Future()
+
+    def on_done(_):
+        if not timely.cancelled() and timely.exception() is None and not timely.result():
+            gate.set_exception(StaleNewsError("此信息或已失效"))
+        else:
+            gate.set_result(True)
+
+    timely.add_done_callback(on_done)
+    return gate
+
+def _reusable(future):
+    """未完成或已成功的 Future 可以复用；失败、被取消或流式生成失败（TextStream.failed）的不复用。"""
+    if not future.done():
+        return True
+    if future.cancelled() or future.exception() is not None:
+        return False
+    return not getattr(future.result(), "failed", False)
+
+def _stage(name, key_parts, start):
+    """
+    按（阶段名, 精确输入）记忆阶段的 Future：输入不变时直接复用，重跑脚本或重复点击不会重新计算。
+    失败的阶段（包括 Gemini 出错）不复用，下次调用时重新提交。start() 负责创建新的 Future。
+    """
+    key = hash_key(name, *key_parts)
+    with _stage_lock:
+        future = _stage_memo.get(key)
+        if future is None or not _reusable(future):
+            future = start()
+            _stage_memo.set(key, future)
+        return future
+
+def analysis_memo_stats():
+    """阶段记忆的命中情况。"""
+    return _stage_memo.stats()
+
+def _load_history(stock_code, news_date_str, days):
+    # 导入 stock_data 需要 Tushare token，只在真正拉取行情时才导入
+    from stock_data import fetch_stock_data
+
+    hist_df = fetch_stock_data(stock_code, news_date_str, days)
+    if hist_df is None or hist_df.empty:
+        raise ValueError("股票数据获取失败，请检查代码或日期。")
+    return hist_df
+
+def _start_stream(deltas):
+    """在流式生成专用的线程池里消费文本生成器，立即返回可重复迭代的 TextStream。"""
+    stream = TextStream()
+    _stream_executor.submit(stream.produce, deltas)
+    return stream
+
+def _investment_advice_from_history(news, hist_df):
+    columns = ['trade_date', 'open', 'close', 'high', 'low', 'vol']
+    short_data_str = hist_df.tail(7)[columns].to_string()
+    long_data_str = hist_df.tail(30)[columns].to_string()
+    return _start_stream(generate_investment_advice(news, short_data_str, long_data_str, stream=True))
+
+def _monte_carlo(hist_df, sim_days, num_simulations, seed):
+    sim_df, end_prices = run_monte_carlo_simulation(hist_df, sim_days=sim_days, num_simulations=num_simulations, seed=seed)
+    start_price = hist_df['close'].iloc[-1]
+    fig, prob_higher = plot_monte_carlo(sim_df, end_prices, start_price)
+    return {"fig": fig, "prob_higher": prob_higher, "median_price": float(np.median(end_prices))}
+
+def submit_bars(stock_code, news_date_str, days=365):
+    """阶段 1：日线数据（Tushare）。返回的 DataFrame 在各阶段、各会话间共享，只读使用。"""
+    return _stage("bars", (stock_code, news_date_str, days),
+                  lambda: _analysis_executor.submit(_load_history, stock_code, news_date_str, days))
+
+def submit_analysis(news_title, news_content, news_date_str, stock_code, days=365):
+    """
+    并发提交投资分析的前置阶段，立即返回 Future 字典：
+        timely   -> bool，新闻时效性（Gemini 失败时 Future 以 GeminiError 结束，调用方按有效处理）
+        hist_df  -> pd.DataFrame，日线数据（Tushare，与时效性判断并发）
+        kline    -> 近 30 个交易日的 K 线图
+        advice   -> TextStream，投资建议（拿到行情后立即开始流式生成）
+
+    行情、K 线图和投资建议都在时效性判断通过后才提交：判定为失效的新闻不会消耗 Tushare 配额
+    和 Gemini 调用，这些 Future 以 StaleNewsError 结束（Gemini 判断失败时按有效处理）。
+    每个阶段按自身的输入记忆：换一条新闻只会重新生成时效性判断和投资建议，行情和 K 线图直接复用。
+    各阶段在会话之间共享（同一股票和日期的行情、K 线图等），所以不会被取消，已提交的阶段照常完成并留在记忆中。
+    蒙特卡洛部分见 submit_monte_carlo。
+    """
+    news = f"{news_title} {news_content}"
+    timely = _stage("timeliness", (date.today(), news_date_str, stock_code, news),
+                    lambda: _analysis_executor.submit(check_timeliness, news_date_str, stock_code,
+                                                      news_title, news_content, raise_errors=True))
+    gate = _timely_gate(timely)
+    hist_df = _after(gate, lambda: submit_bars(stock_code, news_date_str, days))
+    kline = _after(gate, lambda: _stage("kline", (stock_code, news_date_str, days), lambda: _then(
+        [submit_bars(stock_code, news_date_str, days)], lambda df: plot_stock_kline(df.tail(30)))))
+    advice = _after(gate, lambda: _stage("advice", (news, stock_code, news_date_str, days), lambda: _then(
+        [submit_bars(stock_code, news_date_str, days)], lambda df: _investment_advice_from_history(news, df))))
+    return {"timely": timely, "hist_df": hist_df, "kline": kline, "advice": advice}
+
+def submit_monte_carlo(stock_code, news_date_str, sim_days, num_simulations=1000, seed=0, days=365, timely=None):
+    """
+    在行情阶段之后提交蒙特卡洛模拟及其解读，返回 Future 字典：
+        simulation -> {"fig", "prob_higher", "median_price"}
+        advice     -> TextStream，模拟结果解读（Gemini，流式）
+    模拟不依赖大模型，可与投资建议并发执行；固定 seed 使记忆失效后重算的结果不变。
+    切换模拟周期只会计算新周期的这两个阶段。
+    传入 submit_analysis 返回的 timely 时，两个阶段都等时效性判断通过后才提交（失效时以 StaleNewsError 结束）。
+    """
+    key = (stock_code, news_date_str, days, sim_days, num_simulations, seed)
+
+    def simulation_stage():
+        return _stage("simulation", key, lambda: _then(
+            [submit_bars(stock_code, news_date_str, days)], lambda df: _monte_carlo(df, sim_days, num_simulations, seed)))
+
+    def advice_stage():
+        return _stage("simulation_advice", key, lambda: _then([simulation_stage()], lambda result: _start_stream(
+            generate_monte_carlo_advice(stock_code, sim_days, result["prob_higher"], result["median_price"], stream=True))))
+
+    if timely is None:
+        return {"simulation": simulation_stage(), "advice": advice_stage()}
+    gate = _timely_gate(timely)
+    return {"simulation": _after(gate, simulation_stage), "advice": _after(gate, advice_stage)}
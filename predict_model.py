@@ -1,31 +1,264 @@
+import os
+import threading
+import time
+import numpy as np
 import torch
-from transformers import BertTokenizer
+import torch.nn as nn
+from safetensors.torch import load_file, save_file
+from transformers import BertConfig, BertTokenizerFast
+from tracing import span, traced
+from cache_utils import DEFAULT_CACHE_DIR, LRUCache, SQLiteStore, TwoTierCache, hash_key
 # 从 model.py 导入模型结构和切块函数
-from model import DualInputFakeNewsClassifier, split_text_into_chunks
+from model import BERT_MODEL_NAME, DualInputFakeNewsClassifier, split_text_into_chunk_ids
 # === 新增：导入我们的情感分析器 ===
-from sentiment_analyzer import get_article_sentiment
+from sentiment_analyzer import AHO_CHARS_PER_TOKEN, SENTIMENT_ENGINE, SENTIMENT_JIEBA_USERDICT, get_article_sentiment
 
 HF_MODEL_URL = "https://huggingface.co/YanRY/Chinese-financial-news/resolve/main/best_fakenews_modelv3.pt"
-tokenizer = BertTokenizer.from_pretrained("hfl/chinese-roberta-wwm-ext")
+MODEL_VERSION = "best_fakenews_modelv3"
+# 微调权重的本地缓存目录（safetensors 格式，加载时内存映射）
+MODEL_CACHE_DIR = os.environ.get("FAKENEWS_MODEL_DIR", DEFAULT_CACHE_DIR)
+# 离线模式：不发起任何网络请求，tokenizer / 配置 / 权重都必须已在本地缓存中
+OFFLINE = os.environ.get("FAKENEWS_OFFLINE") == "1" or os.environ.get("HF_HUB_OFFLINE") == "1"
+# 推理后端：eager（fp32 原始模型）、int8（BERT 线性层动态量化）、torchscript（整模型导出为 TorchScript 图）
+INFERENCE_BACKENDS = ("eager", "int8", "torchscript")
+INFERENCE_BACKEND = os.environ.get("FAKENEWS_BACKEND", "eager")
 
-_model = None
+# 预测结果缓存：进程内 LRU + 可选 SQLite（设置 FAKENEWS_PREDICT_CACHE_DB 后启用）
+PREDICT_CACHE_SIZE = int(os.environ.get("FAKENEWS_PREDICT_CACHE_SIZE", "1024"))
+PREDICT_CACHE_TTL = float(os.environ.get("FAKENEWS_PREDICT_CACHE_TTL", str(7 * 24 * 3600)))
+PREDICT_CACHE_DB = os.environ.get("FAKENEWS_PREDICT_CACHE_DB")
+prediction_cache = TwoTierCache(
+    LRUCache(maxsize=PREDICT_CACHE_SIZE, ttl=PREDICT_CACHE_TTL),
+    SQLiteStore(PREDICT_CACHE_DB, ttl=PREDICT_CACHE_TTL) if PREDICT_CACHE_DB else None,
+)
+
+# 文本块 [CLS] 向量缓存（float16，按 token id 哈希）：转发/改写的文章只重新编码新出现的块。
+# FAKENEWS_CHUNK_CACHE_SIZE=0 关闭；设置 FAKENEWS_CHUNK_CACHE_DB 后同时落盘
+CHUNK_CACHE_SIZE = int(os.environ.get("FAKENEWS_CHUNK_CACHE_SIZE", "20000"))
+CHUNK_CACHE_DB = os.environ.get("FAKENEWS_CHUNK_CACHE_DB")
+CHUNK_CACHE_MAX_ENTRIES = int(os.environ.get("FAKENEWS_CHUNK_CACHE_MAX_ENTRIES", "500000"))
+chunk_cache = TwoTierCache(
+    LRUCache(maxsize=CHUNK_CACHE_SIZE),
+    SQLiteStore(CHUNK_CACHE_DB, max_entries=CHUNK_CACHE_MAX_ENTRIES) if CHUNK_CACHE_DB else None,
+) if CHUNK_CACHE_SIZE > 0 else None
+_chunk_stats = {"encoded": 0, "cached": 0, "encoder_seconds": 0.0}
+_chunk_stats_lock = threading.Lock()
+
+tokenizer = BertTokenizerFast.from_pretrained(BERT_MODEL_NAME, local_files_only=OFFLINE)
+
+_models = {}  # 后端名 -> 已加载的模型
 _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-def load_model():
-    global _model
-    if _model is None:
-        _model = DualInputFakeNewsClassifier()
-        state_dict = torch.hub.load_state_dict_from_url(HF_MODEL_URL, map_location=_device, progress=True)
-        _model.load_state_dict(state_dict)
-        _model.eval().to(_device)
-    return _model
+def _local_weights_path():
+    """
+    返回本地 safetensors 权重路径。首次运行时下载 .pt 并一次性转换，之后只读本地文件。
+    """
+    path = os.path.join(MODEL_CACHE_DIR, f"{MODEL_VERSION}.safetensors")
+    if os.path.exists(path):
+        return path
+    if OFFLINE:
+        raise FileNotFoundError(f"离线模式下未找到本地模型权重: {path}")
+
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    pt_path = os.path.join(MODEL_CACHE_DIR, f"{MODEL_VERSION}.pt")
+    if not os.path.exists(pt_path):
+        torch.hub.download_url_to_file(HF_MODEL_URL, pt_path, progress=True)
+    state_dict = torch.load(pt_path, map_location="cpu", mmap=True, weights_only=True)
+    tmp_path = path + ".tmp"
+    save_file({k: v.contiguous() for k, v in state_dict.items()}, tmp_path)
+    os.replace(tmp_path, path)
+    del state_dict
+    os.remove(pt_path)
+    return path
+
+class ExportedClassifier:
+    """
+    TorchScript 导出的模型。整条推理链（BERT + BiLSTM/Attention + 上下文/分类头）都在图中，
+    对外保持与 DualInputFakeNewsClassifier 相同的推理接口。
+    """
+    # 追踪时 BERT 输入长度固定为 512，批量推理也需要 padding 到这个长度
+    fixed_seq_len = 512
+
+    def __init__(self, traced, pad_cls, hidden_dim):
+        self._traced = traced
+        self._pad_cls = pad_cls
+        self.bert_hidden_dim = hidden_dim
+
+    def __call__(self, input_ids, attention_mask, context_features):
+        return self._traced(input_ids, attention_mask, context_features)
+
+    def encode_chunks(self, input_ids, attention_mask):
+        return self._traced.encode_chunks(input_ids, attention_mask)
+
+    def classify(self, cls_seq, context_features):
+        return self._traced.classify(cls_seq, context_features)
+
+    def pad_cls(self, device, dtype):
+        return self._pad_cls.to(device=device, dtype=dtype)
+
+def _build_model():
+    # 只读取 BERT 配置搭建结构，不再先加载一份预训练权重再被覆盖
+    config = BertConfig.from_pretrained(BERT_MODEL_NAME, local_files_only=OFFLINE)
+    # 在 meta 设备上搭结构：参数只有形状、不占内存，也不做随机初始化
+    with torch.device("meta"):
+        model = DualInputFakeNewsClassifier(bert_config=config)
+    # safetensors 在 CPU 上按内存映射加载，assign=True 直接复用这些张量，不再拷贝一份
+    state_dict = load_file(_local_weights_path())
+    model.load_state_dict(state_dict, assign=True)
+    _materialize_buffers(model)
+    return model.eval().to(_device)
+
+def _materialize_buffers(model):
+    """非持久化 buffer 不在 state_dict 里，按 BertEmbeddings 的定义在 CPU 上重新生成。"""
+    embeddings = model.bert.embeddings
+    embeddings.position_ids = torch.arange(embeddings.position_embeddings.num_embeddings).expand((1, -1))
+    embeddings.token_type_ids = torch.zeros(embeddings.position_ids.size(), dtype=torch.long)
+    left = [name for name, t in [*model.named_parameters(), *model.named_buffers()] if t.is_meta]
+    if left:
+        raise RuntimeError(f"模型权重未完整加载，仍在 meta 设备上: {left}")
+
+def _export_torchscript(model, max_chunks=4, max_length=512):
+    """用一篇“2 个有效块 + 2 个空块”的样例追踪 forward / encode_chunks / classify。"""
+    input_ids = torch.zeros((1, max_chunks, max_length), dtype=torch.long, device=_device)
+    attention_mask = torch.zeros_like(input_ids)
+    input_ids[0, :2, :8] = 100
+    attention_mask[0, :2, :8] = 1
+    context_feat = torch.zeros((1, 2), dtype=torch.float32, device=_device)
+
+    with torch.no_grad():
+        cls_seq = model.embed_chunks(input_ids, attention_mask)
+        pad_cls = model.pad_cls(cls_seq.device, cls_seq.dtype)
+        traced = torch.jit.trace_module(model, {
+            "forward": (input_ids, attention_mask, context_feat),
+            "encode_chunks": (input_ids[0], attention_mask[0]),
+            "classify": (cls_seq, context_feat),
+        }, strict=False)
+        traced = torch.jit.freeze(traced, preserved_attrs=["encode_chunks", "classify"])
+    return ExportedClassifier(traced, pad_cls, model.bert_hidden_dim)
+
+def _apply_backend(model, backend):
+    if backend == "eager":
+        return model
+    if backend == "int8":
+        if _device.type != "cpu":
+            raise ValueError("int8 动态量化只支持 CPU 推理")
+        # 只量化 BERT 中的线性层，BiLSTM / 分类头保持 fp32
+        torch.ao.quantization.quantize_dynamic(model.bert, {nn.Linear}, dtype=torch.qint8, inplace=True)
+        model.clear_pad_cache()
+        return model
+    if backend == "torchscript":
+        return _export_torchscript(model)
+    raise ValueError(f"未知的推理后端: {backend}，可选: {', '.join(INFERENCE_BACKENDS)}")
+
+def load_model(backend=None):
+    """按后端加载（并缓存）模型，默认使用 INFERENCE_BACKEND。"""
+    backend = backend or INFERENCE_BACKEND
+    if backend not in _models:
+        with span(f"model.load.{backend}"):
+            _models[backend] = _apply_backend(_build_model(), backend)
+    return _models[backend]
 
 def clean_text_for_bert(text):
     # 这是给BERT的简单清洗，可以和情感分析的清洗分开
     return ' '.join(text.strip().split())
 
-def predict_by_model(title, content, platform_code):
-    model = load_model()
+def _prediction_key(title, content, platform_code, backend):
+    """
+    按清洗后的标题/正文、发布平台、权重版本、推理后端和情感打分配置生成缓存键。
+    情感分是模型的输入特征，不同引擎（或是否启用 jieba 用户词典）算出的结果不能共用缓存。
+    """
+    return hash_key(clean_text_for_bert(title), clean_text_for_bert(content), int(platform_code),
+                    MODEL_VERSION, backend or INFERENCE_BACKEND,
+                    SENTIMENT_ENGINE, SENTIMENT_JIEBA_USERDICT, AHO_CHARS_PER_TOKEN)
+
+def _pad_chunk_ids(chunk_ids, seq_len):
+    """把若干块的 token id 右侧补 0 到 seq_len，返回 (input_ids, attention_mask)。"""
+    input_ids = torch.zeros((len(chunk_ids), seq_len), dtype=torch.long)
+    attention_mask = torch.zeros((len(chunk_ids), seq_len), dtype=torch.long)
+    for row, ids in enumerate(chunk_ids):
+        input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    return input_ids, attention_mask
+
+def _chunk_key(ids, backend):
+    """块级缓存键：权重版本 + 推理后端 + 该块的 token id 序列。"""
+    return hash_key(MODEL_VERSION, backend or INFERENCE_BACKEND, ",".join(map(str, ids)))
+
+def _encode_chunks_cached(model, chunk_ids, batch_size, backend):
+    """
+    返回 chunk_ids 中每块的 [CLS] 向量 [N, hidden]（float32）。
+
+    先按 token id 查块级缓存，只把未命中的块（批内去重）按长度排序分桶送入 BERT；
+    padding 位置被 attention mask 屏蔽，所以 [CLS] 与 padding 长度无关，可以跨文章复用。
+    本次新编码的块直接使用 float32 结果；缓存里只存 float16 副本，命中时再转回 float32，
+    因此只有复用的块带有 float16 舍入误差（概率偏差见 benchmarks/bench_chunk_cache.py）。
+    """
+    # TorchScript 图按固定长度追踪，不能动态 padding
+    fixed_seq_len = getattr(model, "fixed_seq_len", None)
+    keys = [_chunk_key(ids, backend) for ids in chunk_ids] if chunk_cache is not None else None
+    vectors = [chunk_cache.get(key) for key in keys] if keys is not None else [None] * len(chunk_ids)
+
+    first_row = {}   # 未命中的块 -> 首次出现的位置（批内去重）
+    for row, vector in enumerate(vectors):
+        if vector is None:
+            first_row.setdefault(keys[row] if keys is not None else row, row)
+    to_encode = sorted(first_row.values(), key=lambda row: len(chunk_ids[row]))
+
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        for start in range(0, len(to_encode), batch_size):
+            bucket = to_encode[start:start + batch_size]
+            seq_len = fixed_seq_len or max(len(chunk_ids[row]) for row in bucket)
+            input_ids, attention_mask = _pad_chunk_ids([chunk_ids[row] for row in bucket], seq_len)
+            with span("model.encode_chunks"):
+                cls = model.encode_chunks(input_ids.to(_device), attention_mask.to(_device))
+            cls = cls.float().cpu().numpy()
+            for row, vector in zip(bucket, cls):
+                vectors[row] = vector
+                if keys is not None:
+                    chunk_cache.set(keys[row], vector.astype(np.float16))
+    encoder_seconds = time.perf_counter() - start_time
+
+    # 批内重复的块直接复用同批的编码结果
+    if keys is not None:
+        for row, vector in enumerate(vectors):
+            if vector is None:
+                vectors[row] = vectors[first_row[keys[row]]]
+
+    with _chunk_stats_lock:
+        _chunk_stats["encoded"] += len(to_encode)
+        _chunk_stats["cached"] += len(chunk_ids) - len(to_encode)
+        _chunk_stats["encoder_seconds"] += encoder_seconds
+
+    if not vectors:
+        return torch.empty((0, model.bert_hidden_dim), dtype=torch.float32, device=_device)
+    return torch.from_numpy(np.stack(vectors).astype(np.float32, copy=False)).to(_device)
+
+def chunk_cache_stats():
+    """
+    块级 [CLS] 缓存的命中情况与节省的编码时间。
+    saved_encoder_seconds 按本进程实测的平均单块编码耗时 × 命中块数估算。
+    """
+    with _chunk_stats_lock:
+        encoded, cached, encoder_seconds = _chunk_stats["encoded"], _chunk_stats["cached"], _chunk_stats["encoder_seconds"]
+    total = encoded + cached
+    per_chunk = encoder_seconds / encoded if encoded else 0.0
+    return {
+        "chunks": total, "encoded": encoded, "cached": cached,
+        "hit_rate": cached / total if total else 0.0,
+        "encoder_seconds": encoder_seconds,
+        "saved_encoder_seconds": per_chunk * cached,
+        "cache": chunk_cache.stats() if chunk_cache is not None else None,
+    }
+
+def predict_by_model(title, content, platform_code, backend=None):
+    # 命中缓存时直接返回，不计算情感分，也不加载模型
+    cache_key = _prediction_key(title, content, platform_code, backend)
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        return cached["label"], cached["prob"], cached["sentiment"]
+
+    model = load_model(backend)
     
     # === 关键步骤 1: 计算情感得分 ===
     # 调用我们新创建的模块来获取整篇文章的情感分
@@ -39,48 +272,112 @@ def predict_by_model(title, content, platform_code):
     # 1. 文本切块 (Chunking)
     max_chunks = 4
     max_length = 512
-    chunks = split_text_into_chunks(full_text, tokenizer, max_tokens=max_length, max_chunks=max_chunks)
+    # 切块时每句只分词一次，直接得到每块的 token id，不再二次编码
+    chunk_ids = split_text_into_chunk_ids(full_text, tokenizer, max_tokens=max_length, max_chunks=max_chunks)
 
-    if not chunks:
+    if not chunk_ids:
         return "无法判断", [0.5, 0.5]
 
-    # 2. 对每个块进行编码
-    input_ids_list = []
-    attention_mask_list = []
-    for chunk in chunks:
-        encoded = tokenizer(
-            chunk,
-            padding='max_length',
-            truncation=True,
-            max_length=max_length,
-            return_tensors='pt'
-        )
-        input_ids_list.append(encoded['input_ids'])
-        attention_mask_list.append(encoded['attention_mask'])
-
-    # 3. 补齐到 max_chunks
-    while len(input_ids_list) < max_chunks:
-        input_ids_list.append(torch.zeros((1, max_length), dtype=torch.long))
-        attention_mask_list.append(torch.zeros((1, max_length), dtype=torch.long))
-
-    # 4. 堆叠成 batch
-    input_ids = torch.cat(input_ids_list, dim=0).unsqueeze(0)
-    attention_mask = torch.cat(attention_mask_list, dim=0).unsqueeze(0)
-
-    # === 关键步骤 2: 使用计算出的情感分准备上下文特征 ===
-    # context_features: [发布来源, 文本情绪]
-    context_feat = torch.tensor([[platform_code, sentiment_score]])
-
-    # 6. 移动到设备并进行预测
-    inputs = {
-        'input_ids': input_ids.to(_device),
-        'attention_mask': attention_mask.to(_device),
-        'context_features': context_feat.to(_device).float()
-    }
+    # 2. 每块的 [CLS] 向量：命中块级缓存的直接复用，其余一次送入 BERT；空块用 padding [CLS] 补齐到 max_chunks
+    with torch.no_grad(), span("model.forward"):
+        cls = _encode_chunks_cached(model, chunk_ids, max_chunks, backend)
+        cls_seq = model.pad_cls(_device, torch.float32).expand(1, max_chunks, model.bert_hidden_dim).clone()
+        cls_seq[0, :len(chunk_ids)] = cls
 
-    with torch.no_grad():
-        logits = model(**inputs)
+        # === 关键步骤 2: 使用计算出的情感分准备上下文特征 ===
+        # context_features: [发布来源, 文本情绪]
+        context_feat = torch.tensor([[platform_code, sentiment_score]], dtype=torch.float32)
+
+        # 3. 只有 BiLSTM / Attention / 分类头需要重新计算
+        logits = model.classify(cls_seq, context_feat.to(_device))
         prob = torch.softmax(logits, dim=1)[0]
         
     result_label = "真实" if prob[1] > 0.5 else "虚假"
-    return result_label, prob.cpu().tolist(), sentiment_score
+    prob = prob.cpu().tolist()
+    prediction_cache.set(cache_key, {"label": result_label, "prob": prob, "sentiment": sentiment_score})
+    return result_label, prob, sentiment_score
+
+
+@traced("model.predict_many")
+def predict_many(articles, batch_size=16, max_chunks=4, max_length=512, backend=None):
+    """
+    批量判别多篇新闻。
+
+    与逐篇调用 predict_by_model 相比：所有文章的文本块按 token 长度排序后分桶，
+    每个桶只 padding 到桶内最长块，一次送入 BERT；空块不参与编码。
+    命中预测缓存的文章直接返回缓存结果，不参与计算。
+
+    Args:
+        articles (iterable): (title, content, platform_code) 元组序列。
+        batch_size (int): 每次送入 BERT 的文本块数 / 分类头的文章数。
+        backend (str): 推理后端，默认使用 INFERENCE_BACKEND。
+
+    Returns:
+        list[dict]: 与输入顺序一致，每项包含 label、prob、sentiment。
+    """
+    return predict_cached(
+        articles, lambda pending: _predict_uncached(pending, batch_size, max_chunks, max_length, backend), backend)
+
+
+def predict_cached(articles, compute, backend=None):
+    """
+    先查本进程的预测缓存，只把未命中的文章交给 compute(articles) -> list[dict] 计算，再把结果写回缓存。
+    predict_many 和推理进程池（worker_pool）共用这层缓存逻辑。
+    """
+    articles = list(articles)
+    cache_keys = [_prediction_key(title, content, code, backend) for title, content, code in articles]
+    results = [prediction_cache.get(key) for key in cache_keys]
+    pending = [i for i, cached in enumerate(results) if cached is None]
+    if pending:
+        computed = compute([articles[i] for i in pending])
+        for i, result in zip(pending, computed):
+            results[i] = result
+            if result["label"] != "无法判断":
+                prediction_cache.set(cache_keys[i], result)
+    return results
+
+
+def _predict_uncached(articles, batch_size, max_chunks, max_length, backend):
+    model = load_model(backend)
+
+    # 1. 情感分 + 切块（切块时已得到每块的 token id）
+    sentiments = []
+    encoded_ids = []
+    chunk_owner = []   # (文章序号, 块序号)
+    for i, (title, content, _) in enumerate(articles):
+        sentiments.append(get_article_sentiment(title, content))
+        full_text = clean_text_for_bert(title + "。" + content)
+        chunk_ids = split_text_into_chunk_ids(full_text, tokenizer, max_tokens=max_length, max_chunks=max_chunks)
+        for j, ids in enumerate(chunk_ids):
+            encoded_ids.append(ids)
+            chunk_owner.append((i, j))
+
+    # 2. 块级缓存未命中的块按 token 长度排序分桶编码
+    with torch.no_grad():
+        hidden_dim = model.bert_hidden_dim
+        pad_cls = model.pad_cls(_device, torch.float32)
+        cls_seq = pad_cls.expand(len(articles), max_chunks, hidden_dim).clone()
+
+        cls = _encode_chunks_cached(model, encoded_ids, batch_size, backend)
+        for k, (i, j) in enumerate(chunk_owner):
+            cls_seq[i, j] = cls[k]
+
+        # 3. 分类头按文章分批
+        context_feat = torch.tensor(
+            [[platform_code, sentiment] for (_, _, platform_code), sentiment in zip(articles, sentiments)],
+            dtype=torch.float32
+        )
+        probs = []
+        for start in range(0, len(articles), batch_size):
+            with span("model.classify"):
+                logits = model.classify(cls_seq[start:start + batch_size], context_feat[start:start + batch_size].to(_device))
+            probs.extend(torch.softmax(logits, dim=1).cpu().tolist())
+
+    has_chunks = set(i for i, _ in chunk_owner)
+    results = []
+    for i, (prob, sentiment) in enumerate(zip(probs, sentiments)):
+        if i not in has_chunks:
+            results.append({"label": "无法判断", "prob": [0.5, 0.5], "sentiment": sentiment})
+        else:
+            results.append({"label": "真实" if prob[1] > 0.5 else "虚假", "prob": prob, "sentiment": sentiment})
+    return results
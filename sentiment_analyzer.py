@@ -1,32 +1,54 @@
-import pandas as pd
+import functools
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import jieba
+import numpy as np
 import re
 import os
+import tempfile
+from lexicon_matcher import LexiconMatcher
+from tracing import span, traced
+
+# 词典和停用词路径 (假设在项目根目录)
+DICT_PATH = "中文金融情感词典_姜富伟等(2020).xlsx"
+STOPWORDS_PATH = "cn_stopwords.txt"
+# 预编译的词典产物：正负词表 + 停用词，JSON 格式，读取比解析 xlsx 快得多。
+# 产物随代码一起提交（词典或停用词更新后运行 python sentiment_analyzer.py 重新生成），默认放在本模块旁边
+LEXICON_ARTIFACT_PATH = os.environ.get(
+    "SENTIMENT_LEXICON_ARTIFACT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sentiment_lexicon.json"))
+# 是否把金融情感词注册为 jieba 用户词典。
+# 注意：这会改变分词结果，从而改变情感分，与模型训练时的特征不再一致，默认关闭。
+SENTIMENT_JIEBA_USERDICT = os.environ.get("SENTIMENT_JIEBA_USERDICT") == "1"
+# 情感打分引擎："jieba"（与训练特征完全一致）或 "aho"（Aho-Corasick 词典扫描，不分词，用于大批量回填）
+SENTIMENT_ENGINES = ("jieba", "aho")
+SENTIMENT_ENGINE = os.environ.get("SENTIMENT_ENGINE", "jieba")
+# aho 引擎估算 token 数时，未命中词典的汉字平均每个 token 的字数（可用基准脚本在语料上校准）
+AHO_CHARS_PER_TOKEN = float(os.environ.get("SENTIMENT_AHO_CHARS_PER_TOKEN", "1.6"))
 
 # --- 全局变量，只加载一次资源，提高效率 ---
 _sentiment_resources = {}
+_lexicon_matcher = None
 
-def _load_resources():
-    """加载情感词典和停用词，并缓存起来。"""
-    global _sentiment_resources
-    if _sentiment_resources:
-        return _sentiment_resources
+def _file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-    print("首次加载情感分析资源...")
-    
-    # 词典和停用词路径 (假设在项目根目录)
-    dict_path = "中文金融情感词典_姜富伟等(2020).xlsx"
-    stopwords_path = "cn_stopwords.txt"
+def _read_sources(dict_path=DICT_PATH, stopwords_path=STOPWORDS_PATH):
+    """从原始 xlsx 词典和停用词文件读取资源（较慢，需要 pandas + openpyxl）。"""
+    import pandas as pd
 
     if not os.path.exists(dict_path):
         raise FileNotFoundError(f"情感词典文件未找到: {dict_path}")
     if not os.path.exists(stopwords_path):
         raise FileNotFoundError(f"停用词文件未找到: {stopwords_path}")
 
-    # 读取正负词表
-    pos_words = pd.read_excel(dict_path, sheet_name="positive")['Positive Word']
-    neg_words = pd.read_excel(dict_path, sheet_name="negative")['Negative Word']
-    
+    # 一次读取正负两个工作表
+    sheets = pd.read_excel(dict_path, sheet_name=["positive", "negative"])
+    pos_words = sheets["positive"]['Positive Word']
+    neg_words = sheets["negative"]['Negative Word']
+
     # 清洗空值和空白字符
     positive_set = set(w.strip() for w in pos_words.dropna() if isinstance(w, str))
     negative_set = set(w.strip() for w in neg_words.dropna() if isinstance(w, str))
@@ -35,29 +57,176 @@ def _load_resources():
     with open(stopwords_path, encoding="utf-8") as f:
         stopwords_set = set(line.strip() for line in f if line.strip())
 
-    _sentiment_resources = {
+    return {
         "positive_set": positive_set,
         "negative_set": negative_set,
         "stopwords_set": stopwords_set
     }
+
+def build_lexicon_artifact(artifact_path=LEXICON_ARTIFACT_PATH, dict_path=DICT_PATH, stopwords_path=STOPWORDS_PATH):
+    """
+    把 xlsx 词典和停用词编译成一个 JSON 产物，并记录源文件的 sha256，
+    源文件变化后产物会被判定为过期。
+    """
+    resources = _read_sources(dict_path, stopwords_path)
+    artifact = {
+        "sources": {
+            "dict_sha256": _file_sha256(dict_path),
+            "stopwords_sha256": _file_sha256(stopwords_path),
+        },
+        "positive": sorted(resources["positive_set"]),
+        "negative": sorted(resources["negative_set"]),
+        "stopwords": sorted(resources["stopwords_set"]),
+    }
+    # 每次写入使用独立的临时文件再原子替换，多个进程同时重建时不会互相覆盖写了一半的文件
+    fd, tmp_path = tempfile.mkstemp(prefix=".sentiment_lexicon.", dir=os.path.dirname(os.path.abspath(artifact_path)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+        os.chmod(tmp_path, 0o644)   # mkstemp 默认只有属主可读
+        os.replace(tmp_path, artifact_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return resources
+
+def _read_artifact(artifact_path=LEXICON_ARTIFACT_PATH, dict_path=DICT_PATH, stopwords_path=STOPWORDS_PATH):
+    """读取预编译产物；不存在或源文件已变化（过期）时返回 None。"""
+    if not os.path.exists(artifact_path):
+        return None
+    try:
+        with open(artifact_path, encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # 源文件还在时校验哈希；只部署了产物（没有 xlsx）时直接使用产物
+    sources = artifact.get("sources", {})
+    if os.path.exists(dict_path) and _file_sha256(dict_path) != sources.get("dict_sha256"):
+        return None
+    if os.path.exists(stopwords_path) and _file_sha256(stopwords_path) != sources.get("stopwords_sha256"):
+        return None
+
+    return {
+        "positive_set": set(artifact["positive"]),
+        "negative_set": set(artifact["negative"]),
+        "stopwords_set": set(artifact["stopwords"])
+    }
+
+def _register_jieba_words(resources):
+    """把正负情感词注册进 jieba 用户词典，使其作为整词切出。"""
+    for word in resources["positive_set"] | resources["negative_set"]:
+        if word:
+            jieba.add_word(word)
+    _resegment.cache_clear()
+
+def _load_resources():
+    """加载情感词典和停用词，并缓存起来。"""
+    global _sentiment_resources
+    if _sentiment_resources:
+        return _sentiment_resources
+
+    print("首次加载情感分析资源...")
+
+    with span("sentiment.load_resources"):
+        resources = _read_artifact()
+        if resources is None:
+            # 产物缺失或过期：回退到解析 xlsx，并尽量重新生成产物
+            try:
+                resources = build_lexicon_artifact()
+            except OSError:
+                resources = _read_sources()
+
+        if SENTIMENT_JIEBA_USERDICT:
+            _register_jieba_words(resources)
+
+    _sentiment_resources = resources
     print("情感分析资源加载完成。")
     return _sentiment_resources
 
-def clean_chinese_text_for_sentiment(text):
-    """专门用于情感分析的文本清洗（分词+去停用词）。"""
+def _segment_for_sentiment(text):
+    """一次分词：去掉标点后用 jieba 切词，返回去除停用词和空白词后的词列表。"""
     if not isinstance(text, str):
-        return ""
+        return []
+    resources = _load_resources()
     # 保留中文、数字、英文字母（去掉标点、特殊字符）
     text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', text)
     # 分词
     words = jieba.lcut(text)
     # 去除停用词 + 空白词
+    return [word for word in words if word not in resources["stopwords_set"] and word.strip()]
+
+@functools.lru_cache(maxsize=200_000)
+def _resegment(word):
+    """
+    单个词再切一次的结果。jieba 按空白把句子分成独立的块分别切分，
+    所以对空格拼接串再分词，等价于对每个词单独再分词，可以按词缓存。
+    """
+    return tuple(jieba.lcut(word))
+
+def _score_tokens(words):
+    """
+    由去停用词后的词列表直接计算情感分，结果与
+    compute_sentiment_score(' '.join(words)) 完全一致（训练特征就是这样算出来的）：
+    每个词按再分词后的结果计数，词与词之间的空格各算一个 token。
+    """
+    if not words:
+        return 0.0
+
     resources = _load_resources()
-    cleaned = [word for word in words if word not in resources["stopwords_set"] and word.strip()]
-    return ' '.join(cleaned)
+    pos_set = resources["positive_set"]
+    neg_set = resources["negative_set"]
+
+    pos_count = neg_count = 0
+    total_words = len(words) - 1   # 拼接时插入的空格
+    for word in words:
+        for w in _resegment(word):
+            pos_count += w in pos_set
+            neg_count += w in neg_set
+            total_words += 1
+
+    score = 2 * (pos_count - neg_count) / total_words
+    return round(score, 4)
+
+def clean_chinese_text_for_sentiment(text):
+    """专门用于情感分析的文本清洗（分词+去停用词）。"""
+    return ' '.join(_segment_for_sentiment(text))
+
+def _get_lexicon_matcher():
+    global _lexicon_matcher
+    if _lexicon_matcher is None:
+        resources = _load_resources()
+        _lexicon_matcher = LexiconMatcher(resources["positive_set"], resources["negative_set"])
+    return _lexicon_matcher
+
+def _score_text_aho(text):
+    """
+    不分词的近似情感分：一次扫描统计正负词命中，未命中部分按平均词长估算 token 数。
+    分母沿用 jieba 引擎的口径（n 个词用空格拼接后再分词，约 2n-1 个 token）。
+    """
+    if not isinstance(text, str):
+        return 0.0
+    text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', text)
+    if not text:
+        return 0.0
+
+    pos_count, neg_count, covered = _get_lexicon_matcher().scan(text)
+    cjk_chars = len(re.findall(r'[\u4e00-\u9fa5]', text))
+    alnum_runs = len(re.findall(r'[a-zA-Z0-9]+', text))
+    num_words = pos_count + neg_count + max(cjk_chars - covered, 0) / AHO_CHARS_PER_TOKEN + alnum_runs
+    total_words = max(2 * num_words - 1, 1)
+
+    score = 2 * (pos_count - neg_count) / total_words
+    return round(score, 4)
 
-def compute_sentiment_score(text):
+def compute_sentiment_score(text, engine=None):
     """计算单个文本的情感得分。"""
+    engine = engine or SENTIMENT_ENGINE
+    if engine == "aho":
+        return _score_text_aho(text)
+    if engine != "jieba":
+        raise ValueError(f"未知的情感打分引擎: {engine}，可选: {', '.join(SENTIMENT_ENGINES)}")
+
     if not isinstance(text, str) or text.strip() == "":
         return 0.0
     
@@ -79,21 +248,58 @@ def compute_sentiment_score(text):
     score = 2 * (pos_count - neg_count) / total_words
     return round(score, 4)
 
-def get_article_sentiment(title, content):
+@traced("sentiment.article")
+def get_article_sentiment(title, content, engine=None):
     """
     计算整篇文章（标题+正文）的加权情感分。
     这是最终提供给外部调用的主函数。
     """
-    # 清洗用于分词和情感计算
-    title_cleaned = clean_chinese_text_for_sentiment(title)
-    content_cleaned = clean_chinese_text_for_sentiment(content)
-
-    # 计算各自的情感分
-    title_sentiment = compute_sentiment_score(title_cleaned)
-    content_sentiment = compute_sentiment_score(content_cleaned)
+    engine = engine or SENTIMENT_ENGINE
+    if engine == "aho":
+        title_sentiment = _score_text_aho(title)
+        content_sentiment = _score_text_aho(content)
+    elif engine == "jieba":
+        # 每段文本只分词一次，同时得到去停用词结果和正负词计数
+        title_sentiment = _score_tokens(_segment_for_sentiment(title))
+        content_sentiment = _score_tokens(_segment_for_sentiment(content))
+    else:
+        raise ValueError(f"未知的情感打分引擎: {engine}，可选: {', '.join(SENTIMENT_ENGINES)}")
     
     # 按照训练时的逻辑进行加权
     # 文章情绪词典分 = (0.6 * 标题情绪词典分 + 0.4 * 正文情绪词典分)
     final_sentiment = (title_sentiment + content_sentiment)
     
     return round(final_sentiment, 4)
+
+def _article_sentiment_triple(args):
+    return get_article_sentiment(*args)
+
+def score_articles(titles, contents, workers=1, chunksize=64, engine=None):
+    """
+    批量计算文章情感分，结果与逐篇调用 get_article_sentiment 完全一致。
+
+    Args:
+        titles, contents (sequence[str]): 等长的标题、正文序列。
+        workers (int): 进程数，jieba 分词受 GIL 限制，>1 时用多进程并行。
+        chunksize (int): 每次分发给子进程的文章数。
+        engine (str): 情感打分引擎，默认使用 SENTIMENT_ENGINE。
+
+    Returns:
+        np.ndarray: float64 情感分数组，顺序与输入一致。
+    """
+    engine = engine or SENTIMENT_ENGINE
+    items = [(title, content, engine) for title, content in zip(titles, contents)]
+    if workers <= 1 or len(items) <= chunksize:
+        scores = [_article_sentiment_triple(item) for item in items]
+    else:
+        # 与推理进程池一致使用 forkserver：调用方可能是多线程进程（Streamlit、推理服务），不能直接 fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"),
+                                 initializer=_load_resources) as pool:
+            scores = list(pool.map(_article_sentiment_triple, items, chunksize=chunksize))
+    return np.asarray(scores, dtype=np.float64)
+
+if __name__ == "__main__":
+    # 构建步骤：python sentiment_analyzer.py
+    res = build_lexicon_artifact()
+    print(f"已生成 {LEXICON_ARTIFACT_PATH}: 正面词 {len(res['positive_set'])} 个，"
+          f"负面词 {len(res['negative_set'])} 个，停用词 {len(res['stopwords_set'])} 个")
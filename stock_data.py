@@ -1,48 +1,346 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import tushare as ts
 import pandas as pd
 import streamlit as st
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from cache_utils import DEFAULT_CACHE_DIR
+from tracing import span, traced
 
-ts.set_token(st.secrets["TUSHARE_TOKEN"])
+ts.set_token(os.environ.get("TUSHARE_TOKEN") or st.secrets["TUSHARE_TOKEN"])
 pro = ts.pro_api()
 
+# 日线数据的本地缓存（SQLite）。设为空字符串则不使用缓存，每次都直接请求 Tushare
+STOCK_CACHE_PATH = os.environ.get("STOCK_CACHE_PATH", os.path.join(DEFAULT_CACHE_DIR, "daily_bars.sqlite"))
+# 距今不足 N 天的日线可能还未收盘定稿，不计入“已覆盖”区间，下次请求时会重新拉取
+STOCK_CACHE_STABLE_LAG_DAYS = int(os.environ.get("STOCK_CACHE_STABLE_LAG_DAYS", "1"))
+# Tushare 接口配额（每分钟调用次数）与瞬时错误的重试次数
+TUSHARE_CALLS_PER_MINUTE = int(os.environ.get("TUSHARE_CALLS_PER_MINUTE", "200"))
+TUSHARE_MAX_RETRIES = int(os.environ.get("TUSHARE_MAX_RETRIES", "3"))
+
+BAR_COLUMNS = ["ts_code", "trade_date", "open", "high", "low", "close",
+               "pre_close", "change", "pct_chg", "vol", "amount"]
+
+
+def _quote_columns(columns):
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+def _tushare_daily(ts_code, start_date, end_date):
+    # 不复权日线与 ts.pro_bar(asset='E', freq='D') 相同；pro_bar 会捕获所有异常、打印后返回 None，
+    # 频率限制和超时都到不了重试逻辑，所以直接调用会抛出异常的 pro.daily
+    return pro.daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
+
+
+class EmptyResponseError(Exception):
+    """拉取函数返回了 None（接口内部吞掉了异常），按瞬时错误重试。"""
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器。
+
+    Args:
+        rate (float): 每秒补充的令牌数。
+        capacity (int): 桶容量，即允许的最大突发调用数。
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, calls_per_minute):
+        """按每分钟配额创建：突发量 + 60 秒内的补充量不超过配额。"""
+        capacity = max(1, calls_per_minute // 10)
+        return cls(rate=max(calls_per_minute - capacity, 1) / 60, capacity=capacity)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_transient_error(exc):
+    """网络异常、超时、空响应和 Tushare 的频率限制都视为可重试。"""
+    if isinstance(exc, (ConnectionError, TimeoutError, OSError, EmptyResponseError)):
+        return True
+    message = str(exc)
+    return any(key in message for key in ("每分钟", "最多访问", "频率", "timed out", "Max retries"))
+
+
+class RateLimitedFetcher:
+    """
+    给日线拉取函数加上共享限流和指数退避重试。fetch_fn 返回 None 时视为失败并重试，
+    重试耗尽后抛出最后一次的异常，不会返回 None。
+
+    Args:
+        fetch_fn (callable): fetch_fn(ts_code, start_date, end_date) -> DataFrame。
+        limiter (TokenBucket): 所有线程共享的限流器。
+        max_retries (int): 瞬时错误的最大重试次数。
+        backoff (float): 第一次重试前的等待秒数，之后每次翻倍（带随机抖动）。
+    """
+
+    def __init__(self, fetch_fn, limiter, max_retries=TUSHARE_MAX_RETRIES, backoff=1.0):
+        self.fetch_fn = fetch_fn
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def __call__(self, ts_code, start_date, end_date):
+        for attempt in range(self.max_retries + 1):
+            with span("tushare.rate_limit_wait"):
+                self.limiter.acquire()
+            try:
+                with span("tushare.daily"):
+                    df = self.fetch_fn(ts_code, start_date, end_date)
+                if df is None:
+                    raise EmptyResponseError(f"{ts_code} {start_date}-{end_date} 日线接口返回空响应")
+                return df
+            except Exception as e:
+                if attempt == self.max_retries or not _is_transient_error(e):
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+
+
+tushare_fetcher = RateLimitedFetcher(_tushare_daily, TokenBucket.per_minute(TUSHARE_CALLS_PER_MINUTE))
+
+
+class DailyBarCache:
+    """
+    按股票代码持久化日线数据，并记录每只股票已经覆盖的日期区间。
+    请求某个区间时只向 Tushare 拉取缺口部分，其余直接从本地读取。
+
+    Args:
+        path (str): SQLite 文件路径。
+        fetch_fn (callable): fetch_fn(ts_code, start_date, end_date) -> DataFrame，
+            日期格式为 'YYYYMMDD'，默认为带限流和重试的 pro.daily；测试时可以替换为假的实现。
+        stable_lag_days (int): 距今不足这么多天的数据不视为已覆盖。
+    """
+
+    def __init__(self, path=STOCK_CACHE_PATH, fetch_fn=None, stable_lag_days=STOCK_CACHE_STABLE_LAG_DAYS):
+        self.path = path
+        self.fetch_fn = fetch_fn or tushare_fetcher
+        self.stable_lag_days = stable_lag_days
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bars ("
+                + ", ".join(f'"{c}" TEXT' if c in ("ts_code", "trade_date") else f'"{c}" REAL' for c in BAR_COLUMNS)
+                + ", PRIMARY KEY (ts_code, trade_date))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "ts_code TEXT, start_date TEXT, end_date TEXT, PRIMARY KEY (ts_code, start_date))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _lock_for(self, ts_code):
+        with self._locks_guard:
+            return self._locks.setdefault(ts_code, threading.Lock())
+
+    def _covered_ranges(self, conn, ts_code):
+        rows = conn.execute(
+            "SELECT start_date, end_date FROM coverage WHERE ts_code = ? ORDER BY start_date", (ts_code,)
+        ).fetchall()
+        return [(_parse_day(a), _parse_day(b)) for a, b in rows]
+
+    def missing_ranges(self, ts_code, start, end):
+        """返回 [start, end] 中尚未覆盖的日期区间列表。"""
+        with self._connect() as conn:
+            covered = self._covered_ranges(conn, ts_code)
+        missing = []
+        cursor = start
+        for a, b in covered:
+            if b < cursor:
+                continue
+            if a > end:
+                break
+            if a > cursor:
+                missing.append((cursor, a - timedelta(days=1)))
+            cursor = max(cursor, b + timedelta(days=1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((cursor, end))
+        return missing
+
+    def _store(self, ts_code, df, start, end):
+        stable_end = min(end, date.today() - timedelta(days=self.stable_lag_days))
+        with self._connect() as conn:
+            if df is not None and not df.empty:
+                columns = [c for c in BAR_COLUMNS if c in df.columns]
+                rows = df[columns].astype(object).where(df[columns].notna(), None).values.tolist()
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO bars ({_quote_columns(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    rows,
+                )
+            if stable_end >= start:
+                self._add_coverage(conn, ts_code, start, stable_end)
+
+    def _add_coverage(self, conn, ts_code, start, end):
+        """记录新覆盖的区间，并与相邻/重叠的已有区间合并。"""
+        ranges = self._covered_ranges(conn, ts_code) + [(start, end)]
+        ranges.sort()
+        merged = [ranges[0]]
+        for a, b in ranges[1:]:
+            last_a, last_b = merged[-1]
+            if a <= last_b + timedelta(days=1):
+                merged[-1] = (last_a, max(last_b, b))
+            else:
+                merged.append((a, b))
+        conn.execute("DELETE FROM coverage WHERE ts_code = ?", (ts_code,))
+        conn.executemany(
+            "INSERT INTO coverage (ts_code, start_date, end_date) VALUES (?, ?, ?)",
+            [(ts_code, _format_day(a), _format_day(b)) for a, b in merged],
+        )
+
+    def get_bars(self, ts_code, start, end):
+        """
+        获取 [start, end]（datetime.date）内的日线，返回与 ts.pro_bar 相同列、按日期降序的 DataFrame。
+        任何一个缺口拉取失败都会抛出异常，而不是返回截止到旧日期的数据；失败的缺口不记录覆盖区间，下次重试。
+        """
+        with self._lock_for(ts_code):
+            for gap_start, gap_end in self.missing_ranges(ts_code, start, end):
+                df = self.fetch_fn(ts_code, _format_day(gap_start), _format_day(gap_end))
+                if df is None:
+                    raise EmptyResponseError(
+                        f"{ts_code} {_format_day(gap_start)}-{_format_day(gap_end)} 日线拉取失败")
+                self._store(ts_code, df, gap_start, gap_end)
+
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                f"SELECT {_quote_columns(BAR_COLUMNS)} FROM bars "
+                "WHERE ts_code = ? AND trade_date BETWEEN ? AND ? ORDER BY trade_date DESC",
+                conn, params=(ts_code, _format_day(start), _format_day(end)),
+            )
+
+
+def _parse_day(s):
+    return datetime.strptime(s, '%Y%m%d').date()
+
+
+def _format_day(d):
+    return d.strftime('%Y%m%d')
+
+
+_bar_cache = None
+
+
+def _get_bar_cache():
+    global _bar_cache
+    if _bar_cache is None and STOCK_CACHE_PATH:
+        _bar_cache = DailyBarCache()
+    return _bar_cache
+
+
+@traced("stock_data.fetch")
+def fetch_stock_data(stock_code, end_date_str, days=365, cache=None):
+    """get_stock_data 的实际实现，异常直接抛出，由调用方决定如何上报。"""
+    end_dt = datetime.strptime(end_date_str, '%Y-%m-%d')
+    # 多取一些数据，比如 days + 100，确保有足够的交易日
+    start_dt = end_dt - timedelta(days=days + 100)
+
+    cache = cache or _get_bar_cache()
+    if cache is not None:
+        df = cache.get_bars(stock_code, start_dt.date(), end_dt.date())
+    else:
+        df = tushare_fetcher(stock_code, start_dt.strftime('%Y%m%d'), end_dt.strftime('%Y%m%d'))
+
+    if df is None or df.empty:
+        return None
+
+    # 数据预处理
+    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
+    df = df.sort_values("trade_date", ascending=True)
+    # 只保留最近的 N 个交易日的数据，保证数据量
+    df = df.tail(days)
+
+    return df
+
+
 def get_stock_data(stock_code, end_date_str, days=365):
     """
     获取指定股票在某个结束日期前一段时间的日线数据。
-    
+    已经拉取过的日期区间从本地缓存读取，只向 Tushare 请求缺口部分。
+
     Args:
         stock_code (str): 股票代码, e.g., '000001.SZ'
         end_date_str (str): 结束日期字符串, e.g., '2024-06-10'
         days (int): 向前取数据的天数，默认为365天，用于计算统计量。
-        
+
     Returns:
         pd.DataFrame or None: 返回包含日线数据的DataFrame，失败则返回None。
     """
     try:
-        end_dt = datetime.strptime(end_date_str, '%Y-%m-%d')
-        # 多取一些数据，比如 days + 100，确保有足够的交易日
-        start_dt = end_dt - timedelta(days=days + 100) 
-        
-        start_date_tushare = start_dt.strftime('%Y%m%d')
-        end_date_tushare = end_dt.strftime('%Y%m%d')
-
-        df = ts.pro_bar(ts_code=stock_code,
-                        start_date=start_date_tushare,
-                        end_date=end_date_tushare,
-                        asset='E',
-                        freq='D')
-
-        if df is None or df.empty:
-            return None
-
-        # 数据预处理
-        df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
-        df = df.sort_values("trade_date", ascending=True)
-        # 只保留最近的 N 个交易日的数据，保证数据量
-        df = df.tail(days) 
-        
-        return df
-
+        return fetch_stock_data(stock_code, end_date_str, days)
     except Exception as e:
         st.error(f"Tushare 数据获取异常: {e}")
         return None
+
+
+def get_stock_data_many(codes, end_date_str, days=365, max_workers=8, as_frame=False, cache=None):
+    """
+    并发获取多只股票的日线数据。所有线程共享同一个 Tushare 限流器，瞬时错误自动退避重试。
+    与 get_stock_data 不同，这里不调用 st.error，而是按股票代码返回错误信息。
+
+    Args:
+        codes (iterable[str]): 股票代码列表。
+        end_date_str (str): 结束日期字符串, e.g., '2024-06-10'
+        days (int): 向前取数据的交易日数。
+        max_workers (int): 线程数。
+        as_frame (bool): True 时把结果拼成一个长表 DataFrame（以 ts_code 区分股票）。
+        cache (DailyBarCache): 使用的日线缓存，默认为全局缓存。
+
+    Returns:
+        tuple: (dict[code -> DataFrame] 或长表 DataFrame, dict[code -> 错误信息])
+    """
+    codes = list(dict.fromkeys(codes))
+    data, errors = {}, {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {code: pool.submit(fetch_stock_data, code, end_date_str, days, cache) for code in codes}
+        for code, future in futures.items():
+            try:
+                df = future.result()
+            except Exception as e:
+                errors[code] = f"{type(e).__name__}: {e}"
+                continue
+            if df is None:
+                errors[code] = "无数据"
+            else:
+                data[code] = df
+
+    if as_frame:
+        frames = [data[code] for code in codes if code in data]
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=BAR_COLUMNS)
+    return data, errors
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# 与 benchmarks/run_suite.py 相同：导入业务模块之前设置好离线凭据，关闭默认的磁盘缓存
+os.environ.setdefault("GEMINI_API_KEY", "offline")
+os.environ.setdefault("TUSHARE_TOKEN", "offline")
+os.environ.setdefault("GEMINI_CACHE_DB", "")
+os.environ.setdefault("STOCK_CACHE_PATH", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+import predict_ai
+from predict_ai import GEMINI_ERROR_TEXT, GeminiClient, GeminiError
+from benchmarks.fakes import StubGeminiServer
+
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    def make(**stub_kwargs):
+        stub = StubGeminiServer(**stub_kwargs).start()
+        monkeypatch.setattr(predict_ai, "_gemini_client", GeminiClient(url=stub.url, max_retries=0))
+        stubs.append(stub)
+        return stub
+
+    stubs = []
+    yield make
+    for stub in stubs:
+        stub.stop()
+
+
+def _advice_stage(key):
+    return predict_ai._stage("test_advice", (key,), lambda: predict_ai._analysis_executor.submit(
+        predict_ai._start_stream, predict_ai.gemini_prompt_stream("请给出建议", ttl=0)))
+
+
+def test_failed_stream_is_not_memoized(stub_client):
+    stub_client(failures=[503], reply="建议持有")
+    key = uuid.uuid4().hex
+
+    first = _advice_stage(key).result(timeout=5)
+    assert first.text() == GEMINI_ERROR_TEXT and first.failed
+
+    second = _advice_stage(key).result(timeout=5)
+    assert second is not first
+    assert second.text().startswith("建议持有") and not second.failed
+    assert _advice_stage(key).result(timeout=5) is second
+
+
+def test_timeliness_stage_error_is_not_memoized(stub_client):
+    stub_client(failures=[503])
+    key = uuid.uuid4().hex
+    # 落在 7~30 天、两类关键词都不命中，需要 Gemini 判断
+    start = lambda: predict_ai._analysis_executor.submit(
+        predict_ai.check_timeliness, str(date.today() - timedelta(days=15)), "600000.SH", "某公司消息", "",
+        raise_errors=True)
+
+    future = predict_ai._stage("test_timeliness", (key,), start)
+    with pytest.raises(GeminiError):
+        future.result(timeout=5)
+    assert predict_ai._stage("test_timeliness", (key,), start) is not future
+
+
+def test_stale_news_skips_bars_and_gemini(stub_client, monkeypatch):
+    stub = stub_client(reply="建议持有")
+    loads = []
+    monkeypatch.setattr(predict_ai, "_load_history", lambda *args: loads.append(args))
+    # 超过 30 天由本地规则直接判定失效
+    news_date = str(date.today() - timedelta(days=60))
+    code = uuid.uuid4().hex
+
+    jobs = predict_ai.submit_analysis("某公司消息", "", news_date, code)
+    mc_jobs = predict_ai.submit_monte_carlo(code, news_date, 30, timely=jobs["timely"])
+
+    assert jobs["timely"].result(timeout=5) is False
+    for future in (jobs["hist_df"], jobs["kline"], jobs["advice"], *mc_jobs.values()):
+        with pytest.raises(predict_ai.StaleNewsError):
+            future.result(timeout=5)
+    assert loads == [] and stub.requests == 0
+
+
+def test_timely_news_fetches_bars_after_verdict(stub_client, monkeypatch):
+    from benchmarks.fakes import make_daily_bars
+
+    stub = stub_client(reply="建议持有")
+    bars = make_daily_bars("600000.SH", "20240101", "20240610").sort_values("trade_date").reset_index(drop=True)
+    loads = []
+    monkeypatch.setattr(predict_ai, "_load_history", lambda *args: loads.append(args) or bars)
+    news_date = str(date.today())
+    code = uuid.uuid4().hex
+
+    jobs = predict_ai.submit_analysis("某公司消息", "", news_date, code)
+    assert jobs["timely"].result(timeout=5) is True
+    assert jobs["hist_df"].result(timeout=5) is bars
+    assert jobs["advice"].result(timeout=5).text().startswith("建议持有")
+    assert len(loads) == 1 and stub.requests == 1
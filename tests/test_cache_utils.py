@@ -0,0 +1,50 @@
+import os
+import time
+
+from cache_utils import LRUCache, SQLiteStore, TwoTierCache
+
+
+def test_disk_hit_is_promoted_with_remaining_ttl(tmp_path):
+    # 与 Gemini 响应缓存相同：内存层没有默认有效期，ttl 逐条指定
+    cache = TwoTierCache(LRUCache(maxsize=10), SQLiteStore(str(tmp_path / "cache.sqlite")))
+    cache.set("k", "v", ttl=0.3)
+    cache.memory.clear()
+
+    assert cache.get("k") == "v"
+    assert cache.disk_hits == 1
+    time.sleep(0.4)
+    assert cache.get("k") is None
+
+
+def test_disk_hit_keeps_original_expiry_not_a_fresh_ttl(tmp_path):
+    cache = TwoTierCache(LRUCache(maxsize=10, ttl=60), SQLiteStore(str(tmp_path / "cache.sqlite"), ttl=60))
+    cache.set("k", "v", ttl=0.3)
+    cache.memory.clear()
+    time.sleep(0.1)
+
+    assert cache.get("k") == "v"
+    time.sleep(0.3)
+    assert cache.get("k") is None
+
+
+def test_entry_without_expiry_uses_memory_default(tmp_path):
+    cache = TwoTierCache(LRUCache(maxsize=10), SQLiteStore(str(tmp_path / "cache.sqlite")))
+    cache.set("k", "v")
+    cache.memory.clear()
+    assert cache.get("k") == "v"
+    assert cache.memory.get("k") == "v"
+
+
+def test_sqlite_store_reconnects_after_fork(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"))
+    store.set("parent", 1)
+
+    pid = os.fork()
+    if pid == 0:
+        ok = store._conn is None and store.get("parent") == 1
+        store.set("child", 2)
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.WEXITSTATUS(status) == 0
+    assert store.get("child") == 2
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import pytest
+
+from stock_data import DailyBarCache, EmptyResponseError, fetch_stock_data
+from benchmarks.fakes import FakeTushareDaily, make_daily_bars
+
+
+@pytest.fixture
+def fake():
+    return FakeTushareDaily()
+
+
+@pytest.fixture
+def cache(tmp_path, fake):
+    return DailyBarCache(path=str(tmp_path / "bars.sqlite"), fetch_fn=fake)
+
+
+def test_missing_ranges_before_between_and_after_coverage(cache):
+    cache.get_bars("600000.SH", date(2024, 3, 1), date(2024, 3, 31))
+    cache.get_bars("600000.SH", date(2024, 5, 1), date(2024, 5, 31))
+
+    assert cache.missing_ranges("600000.SH", date(2024, 2, 1), date(2024, 6, 30)) == [
+        (date(2024, 2, 1), date(2024, 2, 29)),
+        (date(2024, 4, 1), date(2024, 4, 30)),
+        (date(2024, 6, 1), date(2024, 6, 30)),
+    ]
+    assert cache.missing_ranges("600000.SH", date(2024, 3, 5), date(2024, 3, 20)) == []
+    assert cache.missing_ranges("600001.SH", date(2024, 3, 5), date(2024, 3, 20)) == [
+        (date(2024, 3, 5), date(2024, 3, 20)),
+    ]
+
+
+def test_only_gaps_are_fetched_and_coverage_is_merged(cache, fake):
+    cache.get_bars("600000.SH", date(2024, 3, 1), date(2024, 3, 31))
+    cache.get_bars("600000.SH", date(2024, 5, 1), date(2024, 5, 31))
+    df = cache.get_bars("600000.SH", date(2024, 3, 1), date(2024, 5, 31))
+
+    assert fake.calls[-1] == ("600000.SH", "20240401", "20240430")
+    assert len(fake.calls) == 3
+    with cache._connect() as conn:
+        assert cache._covered_ranges(conn, "600000.SH") == [(date(2024, 3, 1), date(2024, 5, 31))]
+
+    # 分段拉取拼出的结果与整段拉取完全一致（同样按日期降序）
+    expected = make_daily_bars("600000.SH", "20240301", "20240531")
+    assert df["trade_date"].tolist() == expected["trade_date"].tolist()
+    assert df["close"].tolist() == pytest.approx(expected["close"].tolist())
+
+    cache.get_bars("600000.SH", date(2024, 3, 10), date(2024, 5, 10))
+    assert len(fake.calls) == 3
+
+
+def test_recent_days_are_refetched_until_stable(cache, fake):
+    today = date.today()
+    cache.get_bars("600000.SH", today - timedelta(days=10), today)
+    cache.get_bars("600000.SH", today - timedelta(days=10), today)
+
+    # 默认 stable_lag_days=1：今天的数据不计入覆盖区间，第二次只重新拉取今天
+    day = today.strftime('%Y%m%d')
+    assert fake.calls[-1] == ("600000.SH", day, day)
+    assert len(fake.calls) == 2
+
+
+def test_failed_gap_raises_instead_of_returning_stale_bars(tmp_path):
+    results = iter([make_daily_bars("600000.SH", "20240301", "20240331"), None])
+    cache = DailyBarCache(path=str(tmp_path / "bars.sqlite"), fetch_fn=lambda *args: next(results))
+    cache.get_bars("600000.SH", date(2024, 3, 1), date(2024, 3, 31))
+
+    with pytest.raises(EmptyResponseError):
+        cache.get_bars("600000.SH", date(2024, 3, 1), date(2024, 4, 30))
+    # 失败的缺口不记为已覆盖，下次还会重新拉取
+    assert cache.missing_ranges("600000.SH", date(2024, 3, 1), date(2024, 4, 30)) == [
+        (date(2024, 4, 1), date(2024, 4, 30)),
+    ]
+
+
+def test_fetch_stock_data_propagates_failed_gap(tmp_path):
+    fake = FakeTushareDaily(fail_codes={"600000.SH": TimeoutError("超时")})
+    cache = DailyBarCache(path=str(tmp_path / "bars.sqlite"), fetch_fn=fake)
+    with pytest.raises(TimeoutError):
+        fetch_stock_data("600000.SH", "2024-06-10", 30, cache)
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from predict_ai import GEMINI_ERROR_TEXT, GeminiClient, GeminiError, TextStream
+from benchmarks.fakes import StubGeminiServer
+
+
+def test_retries_429_and_5xx_honouring_retry_after():
+    with StubGeminiServer(failures=[503, 429, 502], retry_after=1) as stub:
+        client = GeminiClient(url=stub.url, backoff=0.01)
+        start = time.perf_counter()
+        assert client.generate("重试").startswith("[A]")
+        assert time.perf_counter() - start >= 1.0
+    assert stub.requests == 4 and client.retries == 3
+
+
+def test_read_timeout_is_retried():
+    with StubGeminiServer(failures=["hang"], hang_seconds=2) as stub:
+        client = GeminiClient(url=stub.url, read_timeout=0.3, max_retries=1, backoff=0.01)
+        start = time.perf_counter()
+        assert client.generate("超时").startswith("[A]")
+        assert time.perf_counter() - start < 1.5
+    assert stub.requests == 2 and client.retries == 1
+
+
+def test_exhausted_retries_raise_gemini_error():
+    with StubGeminiServer(failures=[500] * 10) as stub:
+        client = GeminiClient(url=stub.url, max_retries=2, backoff=0.01)
+        with pytest.raises(GeminiError, match="HTTP 500"):
+            client.generate("失败")
+    assert stub.requests == 3 and client.metrics()["errors"] == 1
+
+
+def test_concurrency_cap():
+    with StubGeminiServer(delay=0.05) as stub:
+        client = GeminiClient(url=stub.url, max_concurrency=3)
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            list(pool.map(client.generate, [f"并发 {i}" for i in range(24)]))
+    assert stub.max_in_flight == 3
+    # 等待并发名额的时间单独统计，不计入请求延迟
+    metrics = client.metrics()
+    assert metrics["p95_ms"] < metrics["queue_p95_ms"]
+
+
+def test_api_key_is_sent_in_header_and_kept_out_of_errors():
+    with StubGeminiServer() as stub:
+        client = GeminiClient(url=stub.url, api_key="secret-key")
+        client.generate("鉴权")
+        url = stub.url
+    assert stub.api_keys == {"secret-key"} and "secret-key" not in client.url
+
+    # 服务器已关闭：连接失败的错误信息里不能带上 key
+    client = GeminiClient(url=url, api_key="secret-key", max_retries=0)
+    with pytest.raises(GeminiError) as excinfo:
+        client.generate("连接失败")
+    assert "secret-key" not in str(excinfo.value)
+
+
+def test_stream_is_decoded_as_utf8_without_charset():
+    with StubGeminiServer(reply="建议持有，注意风险", stream_chunks=3) as stub:
+        client = GeminiClient(url=stub.url, max_retries=0)
+        text = "".join(client.stream_generate("请给出建议"))
+    assert text.startswith("建议持有，注意风险")
+
+
+def test_text_stream_snapshot_does_not_block():
+    stream = TextStream()
+    assert stream.snapshot() == ("", False)
+    stream.produce(iter(["建议", "持有"]))
+    assert stream.snapshot() == ("建议持有", True)
+
+
+def test_streams_do_not_hold_the_request_slots():
+    with StubGeminiServer(stream_chunks=4, chunk_delay=0.3) as stub:
+        client = GeminiClient(url=stub.url, max_retries=0, max_concurrency=1, max_streams=2)
+        streams = [client.stream_generate(f"流式 {i}") for i in range(2)]
+        for stream in streams:
+            next(stream)   # 两个流都已拿到首个片段，正在占用流式名额
+
+        # 普通请求不等流式生成结束，和两个流同时在服务器上进行
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(client.generate, "普通请求").result(timeout=5)
+        assert stub.max_in_flight == 3
+        for stream in streams:
+            stream.close()
+
+
+def test_text_stream_marks_any_error_as_failed():
+    def deltas():
+        yield "建议"
+        raise sqlite3.OperationalError("database is locked")
+
+    stream = TextStream()
+    stream.produce(deltas())
+    assert stream.failed and stream.text() == f"建议\n\n{GEMINI_ERROR_TEXT}"
@@ -0,0 +1,23 @@
+import numpy as np
+
+from plot_utils import run_monte_carlo_streaming
+from sentiment_analyzer import score_articles
+from benchmarks.fakes import make_daily_bars
+from benchmarks.synthetic import make_articles
+
+
+def test_score_articles_in_forkserver_pool_matches_serial():
+    articles = make_articles(80, num_chars=200)
+    titles = [title for title, _, _ in articles]
+    contents = [content for _, content, _ in articles]
+    np.testing.assert_array_equal(score_articles(titles, contents, workers=2, chunksize=16),
+                                  score_articles(titles, contents))
+
+
+def test_monte_carlo_streaming_in_forkserver_pool_matches_serial():
+    hist = make_daily_bars("600000.SH", "20230101", "20240601").sort_values("trade_date").reset_index(drop=True)
+    hist["trade_date"] = hist["trade_date"].astype("datetime64[ns]")
+    serial = run_monte_carlo_streaming(hist, sim_days=30, num_simulations=20_000, block_size=5_000, seed=1)
+    parallel = run_monte_carlo_streaming(hist, sim_days=30, num_simulations=20_000, block_size=5_000, seed=1,
+                                         workers=2)
+    np.testing.assert_array_equal(parallel.counts, serial.counts)
@@ -0,0 +1,29 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import sentiment_analyzer
+from sentiment_analyzer import _read_artifact, build_lexicon_artifact
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # 词典和停用词按项目根目录的相对路径读取
+    monkeypatch.chdir(ROOT)
+
+
+def test_committed_artifact_matches_sources():
+    assert sentiment_analyzer.LEXICON_ARTIFACT_PATH == os.path.join(ROOT, "sentiment_lexicon.json")
+    assert _read_artifact() is not None, "词典或停用词已更新，请运行 python sentiment_analyzer.py 重新生成产物"
+
+
+def test_concurrent_builds_do_not_collide(tmp_path):
+    artifact_path = str(tmp_path / "sentiment_lexicon.json")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: build_lexicon_artifact(artifact_path), range(4)))
+
+    assert _read_artifact(artifact_path) is not None
+    assert os.listdir(tmp_path) == ["sentiment_lexicon.json"]
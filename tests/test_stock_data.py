@@ -0,0 +1,74 @@
+import pytest
+
+from stock_data import EmptyResponseError, RateLimitedFetcher, TokenBucket, get_stock_data_many
+from benchmarks.fakes import FakeTushareDaily
+
+
+def _fetcher(fake, max_retries=3):
+    return RateLimitedFetcher(fake, TokenBucket(rate=1e6, capacity=1000), max_retries=max_retries, backoff=0.001)
+
+
+def test_quota_error_is_retried_until_window_resets():
+    fake = FakeTushareDaily(quota_per_minute=1, window=0.05)
+    fetch = _fetcher(fake, max_retries=10)
+    fetch("600000.SH", "20240601", "20240607")
+    df = fetch("600000.SH", "20240601", "20240607")
+    assert fake.quota_errors >= 1
+    assert len(df) == 5
+
+
+def test_transient_timeout_is_retried():
+    fake = FakeTushareDaily(error_rate=0.5, seed=1)
+    fetch = _fetcher(fake, max_retries=20)
+    for _ in range(5):
+        assert not fetch("600000.SH", "20240603", "20240607").empty
+    assert fake.transient_errors > 0
+
+
+def test_swallowed_error_returning_none_is_retried():
+    # ts.pro_bar 的行为：打印异常后返回 None
+    fake = FakeTushareDaily(quota_per_minute=1, window=0.05, swallow_errors=True)
+    fetch = _fetcher(fake, max_retries=10)
+    fetch("600000.SH", "20240603", "20240607")
+    assert not fetch("600000.SH", "20240603", "20240607").empty
+    assert fake.quota_errors >= 1
+
+
+def test_retries_exhausted_raises_instead_of_returning_none():
+    fake = FakeTushareDaily(quota_per_minute=0, swallow_errors=True)
+    fetch = _fetcher(fake, max_retries=2)
+    with pytest.raises(EmptyResponseError):
+        fetch("600000.SH", "20240603", "20240607")
+    assert len(fake.calls) == 3
+
+
+def test_permanent_error_is_not_retried():
+    fake = FakeTushareDaily(fail_codes={"BAD.SH": ValueError("代码无效")})
+    fetch = _fetcher(fake)
+    with pytest.raises(ValueError):
+        fetch("BAD.SH", "20240603", "20240607")
+    assert len(fake.calls) == 1
+
+
+def test_get_stock_data_many_reports_errors_per_ticker(tmp_path):
+    from stock_data import DailyBarCache
+
+    fake = FakeTushareDaily(quota_per_minute=3, window=0.05, fail_codes={"BAD.SH": ValueError("代码无效")})
+    cache = DailyBarCache(path=str(tmp_path / "bars.sqlite"), fetch_fn=_fetcher(fake, max_retries=20))
+    codes = ["600000.SH", "600001.SH", "BAD.SH", "600002.SH", "600000.SH"]
+
+    data, errors = get_stock_data_many(codes, "2024-06-10", days=30, max_workers=4, cache=cache)
+
+    assert sorted(data) == ["600000.SH", "600001.SH", "600002.SH"]
+    assert all(len(df) == 30 for df in data.values())
+    assert errors == {"BAD.SH": "ValueError: 代码无效"}
+
+
+def test_get_stock_data_many_long_format(tmp_path):
+    from stock_data import DailyBarCache
+
+    cache = DailyBarCache(path=str(tmp_path / "bars.sqlite"), fetch_fn=_fetcher(FakeTushareDaily()))
+    frame, errors = get_stock_data_many(["600000.SH", "600001.SH"], "2024-06-10", days=20, cache=cache,
+                                        as_frame=True)
+    assert errors == {}
+    assert frame.groupby("ts_code").size().to_dict() == {"600000.SH": 20, "600001.SH": 20}
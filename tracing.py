@@ -0,0 +1,195 @@
+"""
+轻量的分阶段耗时统计：用 span 上下文管理器 / traced 装饰器包住热点代码，
+按阶段名聚合成直方图，可导出为 Prometheus 文本格式或 JSON。
+
+默认关闭（设置 FINANCIAL_NEWS_TRACING=1 或调用 enable() 开启）。关闭时 span 返回一个共享的空对象，
+traced 包装只多一次布尔判断，开销可以忽略。
+设置 FINANCIAL_NEWS_TRACE_LOG=<路径> 时，每个 span 结束后额外追加一行 JSON 日志。
+
+用法：
+    from tracing import span, traced
+
+    with span("gemini.prompt"):
+        ...
+
+    @traced("chunking")
+    def split_text_into_chunks(...):
+        ...
+"""
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+TRACING_ENABLED = os.environ.get("FINANCIAL_NEWS_TRACING") == "1"
+TRACE_LOG_PATH = os.environ.get("FINANCIAL_NEWS_TRACE_LOG")
+# 直方图桶上界（秒），覆盖从分词的毫秒级到 Gemini 的十秒级
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = TRACING_ENABLED
+_histograms = {}
+_lock = threading.Lock()
+_log_file = None
+
+
+class Histogram:
+    """固定桶的耗时直方图（累计形式在导出时计算）。"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.errors += error
+
+    def quantile(self, q):
+        """按桶上界估计分位数（秒）。"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count, "sum": self.sum, "errors": self.errors,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def observe(name, seconds, error=False):
+    """记录一次名为 name 的阶段耗时（秒）。"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds, error)
+    if TRACE_LOG_PATH:
+        _write_log(name, seconds, error)
+
+
+def _write_log(name, seconds, error):
+    global _log_file
+    line = json.dumps({
+        "ts": time.time(), "span": name, "seconds": round(seconds, 6), "error": error,
+        "thread": threading.current_thread().name,
+    }, ensure_ascii=False)
+    with _lock:
+        if _log_file is None:
+            _log_file = open(TRACE_LOG_PATH, "a", encoding="utf-8", buffering=1)
+        _log_file.write(line + "\n")
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name):
+    """计时上下文管理器；关闭时返回共享的空对象。"""
+    return _Span(name) if _enabled else _NOOP_SPAN
+
+
+def traced(name=None):
+    """计时装饰器，name 默认为 模块名.函数名。"""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                observe(span_name, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """各阶段直方图的当前值：{阶段名: {count, sum, mean, p50, p95, p99, errors, buckets}}。"""
+    with _lock:
+        return {name: histogram.to_dict() for name, histogram in sorted(_histograms.items())}
+
+
+def export_json():
+    return json.dumps({"ts": time.time(), "stages": snapshot()}, ensure_ascii=False)
+
+
+def export_prometheus(prefix="financial_news_stage"):
+    """Prometheus 文本格式（histogram 类型，stage 标签区分阶段），另附每阶段的错误计数。"""
+    with _lock:
+        items = [(name, list(h.buckets), list(h.counts), h.count, h.sum, h.errors)
+                 for name, h in sorted(_histograms.items())]
+
+    metric = f"{prefix}_seconds"
+    lines = [f"# HELP {metric} 各阶段耗时（秒）", f"# TYPE {metric} histogram"]
+    for name, buckets, counts, count, total, _ in items:
+        running = 0
+        for bound, bucket_count in zip(buckets, counts):
+            running += bucket_count
+            lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {running}')
+        lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'{metric}_sum{{stage="{name}"}} {total}')
+        lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+    errors_metric = f"{prefix}_errors_total"
+    lines += [f"# HELP {errors_metric} 各阶段抛出异常的次数", f"# TYPE {errors_metric} counter"]
+    for name, _, _, _, _, errors in items:
+        lines.append(f'{errors_metric}{{stage="{name}"}} {errors}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,150 @@
+"""
+多核 CPU 推理进程池：模型只加载一次，N 个推理进程共享同一份权重（写时复制）。
+
+使用 multiprocessing 的 forkserver 启动方式：forkserver 是新启动的单线程干净进程，
+以 preload 方式导入本模块时加载模型、tokenizer 和情感词典，之后每个推理进程都从它 fork 出来。
+这样既能共享已加载的权重（推理只读不写，物理页不会被复制），
+又不会从 Streamlit / HTTP 服务这类多线程进程里直接 fork（其他线程持有的锁会在子进程里永远锁住）。
+每个推理进程用 torch.set_num_threads 设置自己的 intra-op 线程数，
+默认把 CPU 核数平均分给各进程，避免 N 个进程 × 默认线程数造成过量订阅。
+
+预测缓存在调用方进程里查询和写入，命中时不经过推理进程；SQLite 缓存连接按进程各自打开。
+
+环境变量：
+    FAKENEWS_WORKERS         进程数，0 表示不使用进程池（Streamlit 中逐篇在本进程推理）
+    FAKENEWS_WORKER_THREADS  每个进程的 intra-op 线程数，默认 CPU 核数 // 进程数
+
+注意：forkserver 在一个进程里只启动一次，preload 只对第一个进程池生效，所以每个进程只应创建一个进程池
+（Streamlit 中通过 get_worker_pool() 共享）。蒙特卡洛（plot_utils）和批量情感分（sentiment_analyzer）的进程池
+也使用 forkserver，需要推理进程池时应先创建它，否则 forkserver 不会预加载模型。
+
+用法：
+    from worker_pool import InferenceWorkerPool
+
+    with InferenceWorkerPool(num_workers=4) as pool:
+        results = pool.predict_many(articles)
+"""
+import gc
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import torch
+
+from predict_model import INFERENCE_BACKEND, load_model, predict_cached, predict_many
+from sentiment_analyzer import _load_resources
+
+WORKER_POOL_SIZE = int(os.environ.get("FAKENEWS_WORKERS", "0"))
+WORKER_THREADS = int(os.environ.get("FAKENEWS_WORKER_THREADS", "0"))
+# 启动 forkserver 时临时设置，值为要预加载的推理后端；forkserver 导入本模块时据此加载模型
+_PRELOAD_ENV = "FAKENEWS_WORKER_PRELOAD"
+
+
+def _preload(backend):
+    """在 forkserver 进程中加载所有只读资源，之后 fork 出的推理进程直接共享。"""
+    # OpenMP 线程池在 fork 后的子进程中不可用，加载阶段只用单线程，不启动线程池
+    torch.set_num_threads(1)
+    load_model(backend)
+    _load_resources()
+    # 把已有对象移出 GC 跟踪，避免子进程里的垃圾回收改写对象头、触发整页复制
+    gc.collect()
+    gc.freeze()
+
+
+def _init_worker(num_threads):
+    torch.set_num_threads(num_threads)
+
+
+def _worker_pid():
+    return os.getpid()
+
+
+def _predict_shard(articles, batch_size, max_chunks, backend):
+    return predict_many(articles, batch_size=batch_size, max_chunks=max_chunks, backend=backend)
+
+
+class InferenceWorkerPool:
+    """
+    共享同一份模型权重的推理进程池。
+
+    Args:
+        num_workers (int): 推理进程数，默认 FAKENEWS_WORKERS，未设置时为 CPU 核数。
+        threads_per_worker (int): 每个进程的 intra-op 线程数，默认 CPU 核数 // num_workers（至少 1）。
+        backend (str): 推理后端，默认使用 INFERENCE_BACKEND。
+        max_chunks (int): 每篇最多的文本块数。
+    """
+
+    def __init__(self, num_workers=None, threads_per_worker=None, backend=None, max_chunks=4):
+        cpus = os.cpu_count() or 1
+        self.num_workers = num_workers or WORKER_POOL_SIZE or cpus
+        self.threads_per_worker = threads_per_worker or WORKER_THREADS or max(1, cpus // self.num_workers)
+        self.backend = backend or INFERENCE_BACKEND
+        self.max_chunks = max_chunks
+
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        os.environ[_PRELOAD_ENV] = self.backend
+        try:
+            multiprocessing.forkserver.ensure_running()
+        finally:
+            del os.environ[_PRELOAD_ENV]
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker,),
+        )
+        # 推理进程按需创建：一次提交 num_workers 个任务，使全部进程立即启动
+        wait([self._executor.submit(_worker_pid) for _ in range(self.num_workers)])
+
+    def pids(self):
+        """各推理进程的 pid（用于统计内存）。"""
+        return list(self._executor._processes)
+
+    def predict_many(self, articles, batch_size=16):
+        """
+        把未命中预测缓存的文章平均分给各进程并行判别，返回值与 predict_model.predict_many 相同（顺序与输入一致）。
+        """
+        return predict_cached(articles, lambda pending: self._dispatch(pending, batch_size), self.backend)
+
+    def _dispatch(self, articles, batch_size):
+        shard_size = -(-len(articles) // self.num_workers)
+        futures = [
+            self._executor.submit(_predict_shard, articles[start:start + shard_size],
+                                  batch_size, self.max_chunks, self.backend)
+            for start in range(0, len(articles), shard_size)
+        ]
+        return [result for future in futures for result in future.result()]
+
+    def predict(self, title, content, platform_code):
+        """单篇判别，返回 (判定结果, [虚假概率, 真实概率], 情感分)，与 predict_by_model 一致；命中缓存时不经过推理进程。"""
+        result = self.predict_many([(title, content, platform_code)], batch_size=1)[0]
+        return result["label"], result["prob"], result["sentiment"]
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """进程内共享的推理进程池（FAKENEWS_WORKERS 个进程），首次调用时创建。"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = InferenceWorkerPool()
+        return _worker_pool
+
+
+if os.environ.get(_PRELOAD_ENV):
+    _preload(os.environ[_PRELOAD_ENV])